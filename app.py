@@ -1,19 +1,39 @@
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, Response, request, jsonify, stream_with_context
+import importlib
 import json
 import time
 import random
 import logging
 import os
 import re
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from urllib.parse import urlparse, urljoin, parse_qs
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from async_engine import AsyncHttp, EventLoopThread
+from cdp import AsyncBrowser
+from checkpoints import CheckpointStore, ResumableCrawler
+from crawl_state import ShopCrawlState
+from driver_pool import DriverPool
+from export import ExportError, check_export_options, export_content_type, export_filename, iter_export
+from html_extract import parse_document, product_selectors
+from images import ImageCache, ImagePipeline
+from incremental import CrawlStateStore, IncrementalCrawler
+from jobs import JobManager, JobStore, QueueFullError
+from lean_browsing import (
+    BLOCKED_RESOURCE_PATTERNS, BLOCKED_TRACKER_PATTERNS, LeanStats,
+    collect_page_metrics, set_resource_blocking
+)
+from listing_api import ListingApiClient, ListingApiError, listing_card, shop_product_base
+from metrics import (
+    CACHE_EVENTS, DRIVER_POOL_EVENTS, EXTRACTION_TOTAL, TAB_EVENTS, THROTTLE_EVENTS,
+    record_failure, record_stage, render as render_metrics, span, timed_aiter, timed_iter
+)
+from product import Product
+from product_cache import ProductCache
+from storage import data_path
+from tab_scheduler import TabScheduler
+from throttling import RateLimiter, RetryPolicy, ThrottledHttp
 
 # Настройка приложения Flask
 app = Flask(__name__)
@@ -25,98 +45,744 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Тяжелые зависимости (Selenium, BeautifulSoup, requests, aiohttp) загружаются при
+# первом использовании: воркер, который отвечает из кэша или по HTTP, не платит за
+# Selenium. При запуске gunicorn с preload мастер загружает их до fork через
+# preload_backends, и воркеры делят эту память (copy-on-write)
+HEAVY_BACKENDS = (
+    'requests',
+    'requests.adapters',
+    'bs4',
+    'lxml.html',
+    'prometheus_client',
+    'selenium.webdriver',
+    'selenium.webdriver.chrome.options',
+    'selenium.webdriver.support.ui',
+    'selenium.common.exceptions',
+    'aiohttp',
+)
+
+
+def preload_backends():
+    """Загрузка тяжелых зависимостей заранее (в мастере gunicorn перед запуском воркеров)"""
+    started = time.perf_counter()
+    for name in HEAVY_BACKENDS:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Не удалось заранее загрузить {name}: {e}")
+    logger.info(f"Зависимости загружены заранее за {time.perf_counter() - started:.2f} с")
+
+
 # Заголовки для имитации браузера
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36',
     'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
 }
 
-class UzumParser:
+# Настройки пула WebDriver
+DRIVER_POOL_SIZE = int(os.environ.get('DRIVER_POOL_SIZE', '2'))
+DRIVER_MAX_PAGES = int(os.environ.get('DRIVER_MAX_PAGES', '50'))
+DRIVER_POOL_WARMUP = int(os.environ.get('DRIVER_POOL_WARMUP', '1'))
+
+# Параллельная отрисовка товаров во вкладках одного браузера (1 - без вкладок);
+# вкладка пересоздается после TAB_MAX_PAGES страниц или при куче JS больше TAB_MAX_HEAP_MB
+BROWSER_TABS = int(os.environ.get('BROWSER_TABS', '4'))
+TAB_MAX_PAGES = int(os.environ.get('TAB_MAX_PAGES', '20'))
+TAB_MAX_HEAP_MB = int(os.environ.get('TAB_MAX_HEAP_MB', '256'))
+# Сколько запрос ждет товар во вкладке (очередь и загрузка); должно быть меньше
+# таймаута воркера gunicorn (GUNICORN_TIMEOUT, 120 с), иначе воркер убьют раньше
+TAB_TIMEOUT = float(os.environ.get('TAB_TIMEOUT', '90'))
+
+
+# Экономный режим браузера: блокировка изображений, шрифтов, видео и трекеров
+LEAN_BROWSING = os.environ.get('LEAN_BROWSING', '1') == '1'
+LEAN_BLOCKED_PATTERNS = BLOCKED_RESOURCE_PATTERNS + (
+    BLOCKED_TRACKER_PATTERNS if os.environ.get('LEAN_BLOCK_TRACKERS', '1') == '1' else []
+) + [p for p in os.environ.get('LEAN_EXTRA_BLOCKED', '').split(',') if p]
+# Каждая N-я страница загружается полностью, чтобы оценивать экономию (0 - не загружать)
+LEAN_BASELINE_EVERY = int(os.environ.get('LEAN_BASELINE_EVERY', '50'))
+# eager: driver.get возвращается после DOMContentLoaded, не дожидаясь всех ресурсов
+PAGE_LOAD_STRATEGY = os.environ.get('PAGE_LOAD_STRATEGY', 'eager' if LEAN_BROWSING else 'normal')
+
+# Настройки ожидания загрузки страниц
+PAGE_WAIT_TIMEOUT = float(os.environ.get('PAGE_WAIT_TIMEOUT', '10'))
+PAGE_WAIT_POLL = float(os.environ.get('PAGE_WAIT_POLL', '0.2'))
+
+# Страница товара готова, когда заполнено состояние приложения или отрисован заголовок
+PRODUCT_READY_JS = """
+    const s = window.__INITIAL_STATE__;
+    if (s && ((s.pdp && s.pdp.data) || s.product)) return true;
+    const n = window.__NUXT__;
+    if (n && n.state && ((n.state.pdp && n.state.pdp.data) || n.state.product)) return true;
+    const d = window.__NEXT_DATA__;
+    if (d && d.props && d.props.pageProps && d.props.pageProps.product) return true;
+    const h1 = document.querySelector('h1');
+    return document.readyState === 'complete' && !!(h1 && h1.textContent.trim());
+"""
+
+# Данные о товаре из состояния приложения (те же пути, что в _find_product_in_state)
+PRODUCT_STATE_JS = """
+    var productData = null;
+    
+    // Ищем в window.__INITIAL_STATE__
+    if (window.__INITIAL_STATE__) {
+        if (window.__INITIAL_STATE__.pdp && window.__INITIAL_STATE__.pdp.data) {
+            productData = window.__INITIAL_STATE__.pdp.data;
+        } else if (window.__INITIAL_STATE__.product) {
+            productData = window.__INITIAL_STATE__.product;
+        }
+    }
+    
+    // Ищем в window.__NUXT__
+    if (!productData && window.__NUXT__) {
+        if (window.__NUXT__.state && window.__NUXT__.state.pdp && window.__NUXT__.state.pdp.data) {
+            productData = window.__NUXT__.state.pdp.data;
+        } else if (window.__NUXT__.state && window.__NUXT__.state.product) {
+            productData = window.__NUXT__.state.product;
+        }
+    }
+    
+    // Ищем в window.__NEXT_DATA__
+    if (!productData && window.__NEXT_DATA__) {
+        if (window.__NEXT_DATA__.props && window.__NEXT_DATA__.props.pageProps && window.__NEXT_DATA__.props.pageProps.product) {
+            productData = window.__NEXT_DATA__.props.pageProps.product;
+        }
+    }
+    
+    return productData;
+"""
+
+# Страница магазина готова, когда отрисована сетка товаров; при пагинации
+# дополнительно ждем, пока содержимое сетки сменится
+SHOP_READY_JS = """
+    const previous = arguments[0];
+    const links = document.querySelectorAll('a[href*="/product/"]');
+    if (!links.length) return false;
+    const signature = links[0].href + '|' + links[links.length - 1].href + '|' + links.length;
+    return previous ? (signature !== previous ? signature : false) : signature;
+"""
+
+
+# Режим получения товаров: auto (HTTP, затем Selenium), http или selenium
+FETCH_MODES = ('auto', 'http', 'selenium')
+FETCH_MODE = os.environ.get('FETCH_MODE', 'auto')
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+
+# Движок парсера: threads (потоки и пул Selenium) или async (один цикл asyncio,
+# aiohttp и вкладки браузера через DevTools)
+PARSER_ENGINES = ('threads', 'async')
+PARSER_ENGINE = os.environ.get('PARSER_ENGINE', 'threads')
+ASYNC_CONCURRENCY = int(os.environ.get('ASYNC_CONCURRENCY', '200'))
+ASYNC_TASK_TIMEOUT = float(os.environ.get('ASYNC_TASK_TIMEOUT', '60'))
+# Вкладок одновременно в одном браузере; CDP_URL - адрес DevTools уже запущенного браузера
+CDP_MAX_TABS = int(os.environ.get('CDP_MAX_TABS', '8'))
+CDP_URL = os.environ.get('CDP_URL') or None
+
+# Ограничение частоты запросов к каждому хосту, общее для воркеров (0 - без ограничения)
+RATE_LIMIT = float(os.environ.get('RATE_LIMIT', '5'))
+RATE_BURST = int(os.environ.get('RATE_BURST', '10'))
+RATE_MIN = float(os.environ.get('RATE_MIN', '0.2'))
+RATE_COOLDOWN = float(os.environ.get('RATE_COOLDOWN', '30'))
+# Повторы временных ошибок с экспоненциальной задержкой
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+RETRY_BACKOFF = float(os.environ.get('RETRY_BACKOFF', '1'))
+RETRY_MAX_BACKOFF = float(os.environ.get('RETRY_MAX_BACKOFF', '30'))
+
+# Пагинация магазина: auto (API каталога, затем клики по страницам), api или dom
+SHOP_PAGINATION_MODES = ('auto', 'api', 'dom')
+SHOP_PAGINATION = os.environ.get('SHOP_PAGINATION', 'auto')
+LISTING_API_URL = os.environ.get('LISTING_API_URL', 'https://api.uzum.uz/api/v2/shop/{shop_id}/products')
+LISTING_PAGE_SIZE = int(os.environ.get('LISTING_PAGE_SIZE', '100'))
+LISTING_CONCURRENCY = int(os.environ.get('LISTING_CONCURRENCY', '4'))
+
+# Настройки кэша товаров
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') == '1'
+CACHE_PATH = os.environ.get('CACHE_PATH') or data_path('products.sqlite3')
+CACHE_PRICE_TTL = int(os.environ.get('CACHE_PRICE_TTL', '900'))
+CACHE_DETAILS_TTL = int(os.environ.get('CACHE_DETAILS_TTL', '86400'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '100000'))
+
+# Настройки фоновых заданий
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '20'))
+JOB_RESULTS_PAGE_SIZE = 100
+
+# Контрольные точки обхода магазинов: запись порциями по CHECKPOINT_EVERY карточек
+# или товаров; точки старше CHECKPOINT_MAX_AGE секунд не продолжаются
+CHECKPOINT_EVERY = int(os.environ.get('CHECKPOINT_EVERY', '20'))
+CHECKPOINT_MAX_AGE = int(os.environ.get('CHECKPOINT_MAX_AGE', '86400'))
+
+# Выгрузка: число строк в одной порции потокового ответа
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '500'))
+
+# Локальный кэш изображений для выгрузок (загрузка по prefetch_images=1)
+IMAGE_CACHE_ENABLED = os.environ.get('IMAGE_CACHE_ENABLED', '0') == '1'
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR') or data_path('images')
+IMAGE_PREFETCH_CONCURRENCY = int(os.environ.get('IMAGE_PREFETCH_CONCURRENCY', '4'))
+
+# Встроенное состояние приложения в исходном HTML страницы
+STATE_ASSIGN_RE = re.compile(r'window\.(__INITIAL_STATE__|__NUXT__)\s*=\s*')
+NEXT_DATA_RE = re.compile(
+    r'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.DOTALL
+)
+
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Общая requests.Session с пулом соединений; после fork создается заново"""
+    global _http_session, _http_session_pid
+    if _http_session is None or _http_session_pid != os.getpid():
+        with _http_session_lock:
+            if _http_session is None or _http_session_pid != os.getpid():
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+                _http_session_pid = os.getpid()
+    return _http_session
+
+
+rate_limiter = RateLimiter(
+    data_path('rate_limits.sqlite3'),
+    rate=RATE_LIMIT,
+    burst=RATE_BURST,
+    min_rate=RATE_MIN,
+    cooldown=RATE_COOLDOWN,
+    on_event=lambda event: THROTTLE_EVENTS.labels(event).inc()
+) if RATE_LIMIT > 0 else None
+
+http_client = ThrottledHttp(
+    get_http_session,
+    limiter=rate_limiter,
+    policy=RetryPolicy(retries=HTTP_RETRIES, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF),
+    on_event=lambda event: THROTTLE_EVENTS.labels(event).inc()
+)
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, http_client.get, timeout=HTTP_TIMEOUT) if IMAGE_CACHE_ENABLED else None
+
+# Общий цикл asyncio процесса для движка async
+async_loop = EventLoopThread()
+
+async_http = AsyncHttp(
+    HEADERS,
+    limiter=rate_limiter,
+    policy=RetryPolicy(retries=HTTP_RETRIES, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF),
+    connections=ASYNC_CONCURRENCY,
+    timeout=HTTP_TIMEOUT,
+    on_event=lambda event: THROTTLE_EVENTS.labels(event).inc()
+)
+
+# Браузер запускается при первой отрисовке страницы
+async_browser = AsyncBrowser(
+    chrome_bin=os.environ.get('CHROME_BIN'),
+    ws_url=CDP_URL,
+    max_tabs=CDP_MAX_TABS,
+    user_agent=HEADERS['User-Agent'],
+    blocked_patterns=LEAN_BLOCKED_PATTERNS if LEAN_BROWSING else ()
+)
+
+listing_client = ListingApiClient(
+    http_client.get,
+    LISTING_API_URL,
+    page_size=LISTING_PAGE_SIZE,
+    concurrency=LISTING_CONCURRENCY,
+    timeout=HTTP_TIMEOUT,
+    async_fetch=async_http.get
+)
+
+
+class WaitStats:
+    """Статистика фактического времени ожидания загрузки страниц"""
+    
     def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+    
+    def record(self, kind, elapsed, ready):
+        with self._lock:
+            item = self._stats.setdefault(kind, {
+                'count': 0, 'timeouts': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0
+            })
+            item['count'] += 1
+            item['total'] += elapsed
+            item['max'] = max(item['max'], elapsed)
+            item['last'] = elapsed
+            if not ready:
+                item['timeouts'] += 1
+    
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for kind, item in self._stats.items():
+                result[kind] = dict(item, avg=item['total'] / item['count'] if item['count'] else 0.0)
+            return result
+
+
+wait_stats = WaitStats()
+lean_stats = LeanStats()
+
+
+def create_driver():
+    """Создание нового экземпляра Selenium WebDriver"""
+    with span('driver_launch'):
+        return _create_driver()
+
+
+def _create_driver():
+    logger.info("Инициализация Selenium WebDriver")
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument(f"user-agent={HEADERS['User-Agent']}")
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        chrome_options.add_argument("--disable-extensions")
+        # Фоновые вкладки не замедляются: при работе вкладками видима только одна
+        chrome_options.add_argument("--disable-background-timer-throttling")
+        chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+        chrome_options.add_argument("--disable-renderer-backgrounding")
+        chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
+        
+        # На сервере может потребоваться указать путь к chromedriver
+        # (from selenium.webdriver.chrome.service import Service)
+        # service = Service('/usr/bin/chromedriver')
+        # driver = webdriver.Chrome(service=service, options=chrome_options)
+        
+        driver = webdriver.Chrome(options=chrome_options)
+        if LEAN_BROWSING:
+            set_resource_blocking(driver, LEAN_BLOCKED_PATTERNS)
+        logger.info("Selenium WebDriver успешно инициализирован")
+        return driver
+    except Exception as e:
+        logger.error(f"Ошибка при инициализации Selenium: {e}")
+        record_failure('driver_launch')
+        return None
+
+
+def close_driver(driver):
+    """Закрытие Selenium WebDriver"""
+    try:
+        driver.quit()
+        logger.info("Selenium WebDriver закрыт")
+    except Exception as e:
+        logger.error(f"Ошибка при закрытии Selenium: {e}")
+
+
+# Общий пул браузеров процесса: Chrome запускается один раз и переиспользуется
+driver_pool = DriverPool(
+    create_driver,
+    closer=close_driver,
+    max_size=DRIVER_POOL_SIZE,
+    max_pages=DRIVER_MAX_PAGES,
+    on_event=lambda event: DRIVER_POOL_EVENTS.labels(event).inc()
+)
+
+# Общий для воркеров кэш товаров
+product_cache = ProductCache(
+    CACHE_PATH,
+    volatile_ttl=CACHE_PRICE_TTL,
+    static_ttl=CACHE_DETAILS_TTL,
+    max_entries=CACHE_MAX_ENTRIES,
+    on_event=lambda event: CACHE_EVENTS.labels(event).inc()
+) if CACHE_ENABLED else None
+
+
+class UzumParser:
+    def __init__(self, pool=None, wait_timeout=None, fetch_mode=None, cache=None, pagination=None, tabs=None):
         self.base_url = "https://uzum.uz"
-        self.driver = None
+        self.pool = pool or driver_pool
+        self.cache = cache or product_cache
+        self.wait_timeout = PAGE_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+        self.fetch_mode = fetch_mode or FETCH_MODE
+        self.pagination = pagination or SHOP_PAGINATION
+        self.images = ImagePipeline(self.base_url)
+        self.listing_client = listing_client
+        # tabs=False - товар в отдельном браузере из пула, без общей очереди вкладок
+        self.tabs = tab_scheduler if tabs is None else (tabs or None)
+    
+    def _acquire_driver(self):
+        """Получение WebDriver из пула"""
+        with span('driver_acquire'):
+            driver = self.pool.acquire()
+        if not driver:
+            logger.error("Не удалось инициализировать Selenium")
+            record_failure('driver_acquire')
+        return driver
+    
+    def _release_driver(self, driver, failed=False):
+        """Возврат WebDriver в пул; после ошибки браузер проверяется на работоспособность"""
+        broken = failed and not self.pool.is_alive(driver)
+        self.pool.release(driver, broken=broken)
+    
+    def _open_page(self, driver, url):
+        """Переход на страницу; в экономном режиме иногда без блокировки для контрольного замера"""
+        baseline = False
+        if LEAN_BROWSING:
+            baseline = lean_stats.next_is_baseline(LEAN_BASELINE_EVERY)
+            set_resource_blocking(driver, [] if baseline else LEAN_BLOCKED_PATTERNS)
+        # Браузер делит лимит запросов к хосту с HTTP-клиентом
+        host = urlparse(url).hostname
+        if rate_limiter is not None and host and not rate_limiter.acquire(host):
+            raise RuntimeError(f"Не дождались лимита запросов к {host}")
+        with span('navigation'):
+            driver.get(url)
+        return baseline
+    
+    def _report_page_load(self, driver, kind, baseline):
+        """Учет объема и времени загрузки страницы в экономном режиме"""
+        if not LEAN_BROWSING:
+            return
+        metrics = collect_page_metrics(driver)
+        if not metrics:
+            return
+        saved = lean_stats.record(metrics, baseline)
+        # Объем - нижняя оценка: размер ресурсов с других доменов часто не виден
+        message = (
+            f"Загрузка страницы ({kind}{', контрольная' if baseline else ''}): "
+            f"не меньше {metrics['bytes'] / 1024:.0f} КБ (без размера {metrics.get('opaque') or 0} ресурсов), "
+            f"{metrics['load_ms']} мс"
+        )
+        if saved:
+            message += f", экономия ~{saved['bytes'] / 1024:.0f} КБ и ~{saved['load_ms']:.0f} мс"
+        logger.info(message)
+    
+    def _wait_for_page(self, driver, kind, script, *args):
+        """Ожидание готовности страницы по условию вместо фиксированной паузы
         
-    def _setup_selenium(self):
-        """Настройка Selenium WebDriver"""
-        if self.driver is not None:
-            return self.driver
-            
-        logger.info("Инициализация Selenium WebDriver")
+        Возвращает результат условия (или None по таймауту) и записывает фактическое время ожидания.
+        """
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        
+        started = time.monotonic()
+        result = None
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument(f"user-agent={HEADERS['User-Agent']}")
-            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            chrome_options.add_argument("--disable-extensions")
-            
-            # На сервере может потребоваться указать путь к chromedriver
-            # service = Service('/usr/bin/chromedriver')
-            # self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            with span(f'wait_{kind}'):
+                result = WebDriverWait(driver, self.wait_timeout, poll_frequency=PAGE_WAIT_POLL).until(
+                    lambda d: d.execute_script(script, *args)
+                )
+        except TimeoutException:
+            logger.warning(f"Страница ({kind}) не подготовилась за {self.wait_timeout} секунд, продолжаем")
+        elapsed = time.monotonic() - started
+        wait_stats.record(kind, elapsed, result is not None)
+        logger.info(f"Ожидание загрузки страницы ({kind}): {elapsed:.2f} с")
+        return result
+    
+    def get_product_details(self, product_url, mode=None):
+        """Получение информации о товаре: сначала по HTTP, при неудаче через Selenium"""
+        if not product_url:
+            logger.error("URL товара не определен")
+            return None
+        
+        with span('product'):
+            product_data = self._fetch_product(product_url, mode)
+        EXTRACTION_TOTAL.labels(product_data.source if product_data else 'failed').inc()
+        return product_data
+    
+    def _fetch_product(self, product_url, mode):
+        """Получение товара из кэша, по HTTP или через Selenium"""
+        # Сначала проверяем кэш по ID товара
+        product_id = self._extract_product_id(product_url)
+        cached = None
+        if self.cache is not None and product_id:
+            with span('cache_lookup'):
+                cached = self.cache.get(product_id)
+            if cached and cached.fresh:
+                logger.info(f"Товар {product_id} получен из кэша")
+                return Product.from_dict(cached.product, url=product_url, source='cache')
+        
+        mode = mode or self.fetch_mode
+        if mode in ('auto', 'http'):
+            product_data, validators = self._get_product_details_http(
+                product_url, cached.validators if cached else None
+            )
+            if product_data is None and validators is not None and cached:
+                # 304 Not Modified: данные в кэше актуальны
+                logger.info(f"Товар {product_id} не изменился, продлеваем запись кэша")
+                self.cache.revalidate(product_id, validators.get('etag'), validators.get('last_modified'))
+                return Product.from_dict(cached.product, url=product_url, source='cache_revalidated')
+            if product_data:
+                self._store_in_cache(product_id, product_data, validators)
+                return product_data
+            if mode == 'http':
+                return None
+            logger.info(f"Не удалось получить данные по HTTP, используем Selenium: {product_url}")
+        
+        product_data = self._get_product_details_selenium(product_url)
+        if product_data and product_data.source == 'selenium_js':
+            self._store_in_cache(product_id, product_data)
+        return product_data
+    
+    def _extract_product_id(self, product_url):
+        """Извлечение ID товара из URL"""
+        parts = product_url.split('/')
+        for i, part in enumerate(parts):
+            if part == 'product' and i+1 < len(parts):
+                return parts[i+1].split('?')[0]
+        return None
+    
+    def _store_in_cache(self, product_id, product_data, validators=None):
+        """Сохранение товара в кэш"""
+        if self.cache is None or not product_id:
+            return
+        validators = validators or {}
+        self.cache.put(product_id, product_data.to_dict(), validators.get('etag'), validators.get('last_modified'))
+    
+    def _get_product_result(self, index, product_url, mode):
+        """Получение одного товара из пакета; ошибка не прерывает остальные"""
+        try:
+            product_data = self.get_product_details(product_url, mode=mode)
+            error = None if product_data else 'Не удалось получить данные о товаре'
+        except Exception as e:
+            logger.error(f"Ошибка при получении товара {product_url}: {e}")
+            product_data = None
+            error = str(e)
+        return {'index': index, 'url': product_url, 'product': product_data, 'error': error}
+    
+    def iter_products_details(self, product_urls, concurrency=None, mode=None):
+        """Параллельное получение товаров; результаты выдаются по мере готовности
+        
+        product_urls может быть генератором (например, iter_shop_products), тогда
+        получение товаров идет одновременно с обходом магазина.
+        """
+        concurrency = max(1, concurrency or BATCH_CONCURRENCY)
+        logger.info(f"Пакетное получение товаров, параллельно: {concurrency}")
+        
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='uzum-batch')
+        pending = set()
+        try:
+            for i, url in enumerate(product_urls):
+                pending.add(executor.submit(self._get_product_result, i, url, mode))
+                
+                # Не набираем очередь больше, чем успеваем обработать
+                if len(pending) >= concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
             
-            self.driver = webdriver.Chrome(options=chrome_options)
-            logger.info("Selenium WebDriver успешно инициализирован")
-            return self.driver
+            for future in as_completed(pending):
+                yield future.result()
+        finally:
+            # Если потребитель прервал итерацию, отменяем еще не начатые задачи
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_products_details(self, product_urls, concurrency=None, mode=None, ordered=True):
+        """Пакетное получение товаров в порядке входного списка (или в порядке готовности)"""
+        results = list(self.iter_products_details(product_urls, concurrency=concurrency, mode=mode))
+        if ordered:
+            results.sort(key=lambda item: item['index'])
+        
+        failed = sum(1 for item in results if item['error'])
+        logger.info(f"Пакет обработан: {len(results) - failed} успешно, {failed} с ошибками")
+        return results
+    
+    def _get_product_details_http(self, product_url, conditional_headers=None):
+        """Получение информации о товаре без браузера: один HTTP-запрос и разбор встроенных данных
+        
+        Возвращает (product_data, validators); при ответе 304 product_data равен None,
+        а validators содержит обновленные ETag/Last-Modified.
+        """
+        logger.info(f"Загрузка страницы товара по HTTP: {product_url}")
+        try:
+            with span('http_fetch'):
+                response = http_client.get(
+                    product_url, headers=conditional_headers or None, timeout=HTTP_TIMEOUT
+                )
         except Exception as e:
-            logger.error(f"Ошибка при инициализации Selenium: {e}")
-            return None
+            logger.error(f"Ошибка при загрузке страницы товара по HTTP: {e}")
+            return None, None
+        return self._product_from_response(product_url, response, conditional_headers)
+    
+    def _product_from_response(self, product_url, response, conditional_headers=None):
+        """Разбор ответа со страницей товара; результат как у _get_product_details_http"""
+        try:
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            if response.status_code == 304 and conditional_headers:
+                return None, validators
+            if response.status_code != 200:
+                logger.warning(f"HTTP {response.status_code} при загрузке страницы товара")
+                record_failure('http_fetch')
+                return None, None
+            if 'charset' not in response.headers.get('Content-Type', ''):
+                # Без явной кодировки requests считает страницу ISO-8859-1
+                response.encoding = 'utf-8'
+            html = response.text
+        except Exception as e:
+            logger.error(f"Ошибка при чтении страницы товара: {e}")
+            return None, None
+        
+        with span('state_extract'):
+            data = self._extract_data_from_html(html)
+        if not data:
+            logger.warning("Не удалось найти данные о товаре в HTML страницы")
+            record_failure('state_extract')
+            return None, None
+        
+        product_data = self._process_js_data(data)
+        if product_data:
+            product_data.url = product_url
+            product_data.source = 'http'
+        return product_data, validators
     
-    def _close_selenium(self):
-        """Закрытие Selenium WebDriver"""
-        if self.driver:
+    def _extract_data_from_html(self, html):
+        """Поиск данных о товаре в исходном HTML: встроенное состояние или метатеги og:"""
+        # window.__INITIAL_STATE__ = {...} / window.__NUXT__ = {...}
+        for match in STATE_ASSIGN_RE.finditer(html):
+            start = match.end()
+            if html[start:start + 1] != '{':
+                # __NUXT__ часто записан как вызов функции, а не JSON
+                continue
             try:
-                self.driver.quit()
-                self.driver = None
-                logger.info("Selenium WebDriver закрыт")
-            except Exception as e:
-                logger.error(f"Ошибка при закрытии Selenium: {e}")
+                state, _ = json.JSONDecoder().raw_decode(html, start)
+            except ValueError:
+                continue
+            
+            if match.group(1) == '__NUXT__':
+                state = state.get('state') or {}
+            product = self._find_product_in_state(state)
+            if product:
+                logger.info(f"Получены данные о товаре из window.{match.group(1)}")
+                return product
+        
+        # <script id="__NEXT_DATA__" type="application/json">
+        match = NEXT_DATA_RE.search(html)
+        if match:
+            try:
+                next_data = json.loads(match.group(1))
+                product = next_data.get('props', {}).get('pageProps', {}).get('product')
+                if product:
+                    logger.info("Получены данные о товаре из __NEXT_DATA__")
+                    return product
+            except ValueError as e:
+                logger.error(f"Ошибка при разборе __NEXT_DATA__: {e}")
+        
+        return self._extract_og_meta(html)
     
-    def get_product_details(self, product_url):
-        """Получение информации о товаре через Selenium"""
-        if not product_url:
-            logger.error("URL товара не определен")
+    def _find_product_in_state(self, state):
+        """Поиск данных о товаре в состоянии приложения (те же пути, что и в JS скрипте)"""
+        if not isinstance(state, dict):
             return None
+        pdp = state.get('pdp')
+        if isinstance(pdp, dict) and pdp.get('data'):
+            return pdp['data']
+        return state.get('product') or None
+    
+    def _extract_og_meta(self, html):
+        """Сбор данных о товаре из метатегов og: и product:"""
+        from bs4 import BeautifulSoup
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        meta = {}
+        for tag in soup.find_all('meta'):
+            key = tag.get('property') or tag.get('name')
+            if key and key.startswith(('og:', 'product:')) and tag.get('content'):
+                meta.setdefault(key, []).append(tag['content'])
+        
+        if not meta.get('og:title'):
+            return None
+        
+        data = {
+            'title': meta['og:title'][0],
+            'photos': meta.get('og:image', []),
+        }
+        if meta.get('og:description'):
+            data['description'] = meta['og:description'][0]
+        if meta.get('product:price:amount'):
+            price_digits = re.sub(r'[^\d.]', '', meta['product:price:amount'][0])
+            if price_digits:
+                try:
+                    price = float(price_digits)
+                    data['price'] = int(price) if price.is_integer() else price
+                except ValueError:
+                    pass
+        logger.info("Получены данные о товаре из метатегов og:")
+        return data
+    
+    def _get_product_details_selenium(self, product_url):
+        """Получение информации о товаре через Selenium"""
+        if self.tabs is not None:
+            return self._get_product_details_tab(product_url)
         
-        driver = self._setup_selenium()
+        driver = self._acquire_driver()
         if not driver:
-            logger.error("Не удалось инициализировать Selenium")
             return None
         
         logger.info(f"Загрузка страницы товара через Selenium: {product_url}")
+        failed = False
         
         try:
-            driver.get(product_url)
+            baseline = self._open_page(driver, product_url)
             
             # Ждем загрузки основных элементов товара
-            wait_time = 5
-            logger.info(f"Ожидание {wait_time} секунд для полной загрузки страницы")
-            time.sleep(wait_time)
-            
-            # Извлекаем ID товара из URL
-            product_id = None
-            parts = product_url.split('/')
-            for i, part in enumerate(parts):
-                if part == 'product' and i+1 < len(parts):
-                    product_id = parts[i+1].split('?')[0]
-                    break
-            
-            # Получаем данные о товаре
-            product_data = self._extract_data_from_js(driver)
-            if product_data:
-                # Добавляем URL товара
-                product_data['url'] = product_url
-                return product_data
-            
-            # Если не удалось извлечь данные из JS, пробуем парсить HTML
-            return self._parse_html(driver, product_url)
+            self._wait_for_page(driver, 'product', PRODUCT_READY_JS)
+            self._report_page_load(driver, 'product', baseline)
+            return self._harvest_product(driver, product_url)
         
         except Exception as e:
             logger.error(f"Ошибка при получении данных о товаре через Selenium: {e}")
+            record_failure('selenium_product')
+            failed = True
             return None
         finally:
-            # Закрываем Selenium после использования
-            self._close_selenium()
+            # Возвращаем браузер в пул для следующих запросов
+            self._release_driver(driver, failed)
+    
+    def _get_product_details_tab(self, product_url):
+        """Получение информации о товаре во вкладке общего браузера (TabScheduler)"""
+        logger.info(f"Загрузка страницы товара во вкладке браузера: {product_url}")
+        future = self.tabs.submit(product_url)
+        try:
+            with span('tab_render'):
+                return future.result(TAB_TIMEOUT)
+        except Exception as e:
+            future.cancel()
+            logger.error(f"Ошибка при получении данных о товаре во вкладке браузера: {e}")
+            record_failure('selenium_product')
+            return None
+    
+    def _harvest_tab(self, driver, product_url, ready, waited, baseline):
+        """Разбор готовой вкладки с тем же учетом ожидания и загрузки, что и у отдельного браузера"""
+        record_stage('wait_product', waited)
+        wait_stats.record('product', waited, ready)
+        logger.info(f"Ожидание загрузки страницы во вкладке: {waited:.2f} с")
+        self._report_page_load(driver, 'product', baseline)
+        if baseline:
+            # Контрольная страница загружалась без блокировки: возвращаем ее для вкладки
+            set_resource_blocking(driver, LEAN_BLOCKED_PATTERNS)
+        return self._harvest_product(driver, product_url)
+    
+    def _harvest_product(self, driver, product_url):
+        """Данные о товаре с открытой страницы: из JS-состояния, при неудаче из HTML"""
+        with span('js_extract'):
+            product_data = self._extract_data_from_js(driver)
+        if product_data:
+            # Добавляем URL товара
+            product_data.url = product_url
+            product_data.source = 'selenium_js'
+            return product_data
+        
+        # Если не удалось извлечь данные из JS, пробуем парсить HTML
+        record_failure('js_extract')
+        product_data = self._parse_html(driver, product_url)
+        product_data.source = 'selenium_html'
+        return product_data
     
     def _extract_data_from_js(self, driver):
         """Извлечение данных о товаре из JavaScript переменных"""
@@ -124,36 +790,7 @@ class UzumParser:
         
         js_scripts = [
             # Попытка найти данные о товаре в глобальных переменных
-            """
-            var productData = null;
-            
-            // Ищем в window.__INITIAL_STATE__
-            if (window.__INITIAL_STATE__) {
-                if (window.__INITIAL_STATE__.pdp && window.__INITIAL_STATE__.pdp.data) {
-                    productData = window.__INITIAL_STATE__.pdp.data;
-                } else if (window.__INITIAL_STATE__.product) {
-                    productData = window.__INITIAL_STATE__.product;
-                }
-            }
-            
-            // Ищем в window.__NUXT__
-            if (!productData && window.__NUXT__) {
-                if (window.__NUXT__.state && window.__NUXT__.state.pdp && window.__NUXT__.state.pdp.data) {
-                    productData = window.__NUXT__.state.pdp.data;
-                } else if (window.__NUXT__.state && window.__NUXT__.state.product) {
-                    productData = window.__NUXT__.state.product;
-                }
-            }
-            
-            // Ищем в window.__NEXT_DATA__
-            if (!productData && window.__NEXT_DATA__) {
-                if (window.__NEXT_DATA__.props && window.__NEXT_DATA__.props.pageProps && window.__NEXT_DATA__.props.pageProps.product) {
-                    productData = window.__NEXT_DATA__.props.pageProps.product;
-                }
-            }
-            
-            return productData;
-            """
+            PRODUCT_STATE_JS
         ]
         
         for i, script in enumerate(js_scripts):
@@ -170,16 +807,9 @@ class UzumParser:
     
     def _process_js_data(self, data):
         """Обработка данных о товаре, полученных из JavaScript"""
-        product_data = {}
-        
         try:
             # Название товара
-            if 'title' in data:
-                product_data['name'] = data['title']
-            elif 'name' in data:
-                product_data['name'] = data['name']
-            else:
-                product_data['name'] = 'Название не найдено'
+            name = data.get('title') or data.get('name')
             
             # Описание товара
             description = None
@@ -188,24 +818,16 @@ class UzumParser:
             elif 'detail' in data and 'description' in data['detail']:
                 description = data['detail']['description']
             
-            product_data['description'] = description or 'Описание отсутствует'
-            
-            # Цена товара
-            if 'price' in data:
-                if isinstance(data['price'], dict):
-                    price = data['price'].get('current') or data['price'].get('price')
-                else:
-                    price = data['price']
-                
-                if price:
-                    product_data['price'] = f"{price:,.0f} сум"
-                    product_data['price_raw'] = price  # Добавляем числовое значение для сортировки
-                else:
-                    product_data['price'] = 'Цена не указана'
-                    product_data['price_raw'] = 0
-            else:
-                product_data['price'] = 'Цена не указана'
-                product_data['price_raw'] = 0
+            # Цена товара (строка с ценой вычисляется из числового значения)
+            price = data.get('price')
+            if isinstance(price, dict):
+                price = price.get('current') or price.get('price')
+            if isinstance(price, str):
+                try:
+                    price = float(price.replace(' ', '').replace(',', '.'))
+                    price = int(price) if price.is_integer() else price
+                except ValueError:
+                    price = 0
             
             # Изображения товара
             images = []
@@ -220,46 +842,31 @@ class UzumParser:
                                     images.append(img[key])
                                     break
             
-            # Нормализация URL изображений
-            normalized_images = []
-            for img_url in images:
-                if img_url.startswith('//'):
-                    img_url = 'https:' + img_url
-                elif img_url.startswith('/'):
-                    img_url = urljoin(self.base_url, img_url)
-                normalized_images.append(img_url)
-            
-            product_data['images'] = normalized_images if normalized_images else []
-            
-            # Добавляем строку с изображениями через запятую для удобства импорта
-            product_data['images_str'] = ','.join(product_data['images'])
-            
             # Проверяем наличие информации о цветах
-            if 'colors' in data and isinstance(data['colors'], list) and data['colors']:
-                product_data['colors'] = []
+            colors = []
+            if isinstance(data.get('colors'), list):
                 for color in data['colors']:
-                    if isinstance(color, dict):
-                        color_name = color.get('name', '')
-                        color_id = color.get('id', '')
-                        if color_name:
-                            product_data['colors'].append({
-                                'name': color_name,
-                                'id': color_id
-                            })
-                
-                # Добавляем строку с цветами через запятую
-                product_data['colors_str'] = ','.join([c['name'] for c in product_data['colors']])
+                    if isinstance(color, dict) and color.get('name'):
+                        colors.append((color['name'], color.get('id', '')))
             
             # Доступность товара
             if 'availableAmount' in data:
-                product_data['availability'] = data['availableAmount'] > 0
+                availability = data['availableAmount'] > 0
             elif 'inStock' in data:
-                product_data['availability'] = data['inStock']
+                availability = data['inStock']
             else:
-                product_data['availability'] = True  # Предполагаем, что товар доступен по умолчанию
+                availability = True  # Предполагаем, что товар доступен по умолчанию
             
-            logger.info(f"Успешно обработаны данные о товаре из JS: {product_data['name']}")
-            return product_data
+            product = Product(
+                name=name,
+                description=description,
+                price_raw=price or 0,
+                images=self.images.process(images),
+                colors=colors,
+                availability=availability
+            )
+            logger.info(f"Успешно обработаны данные о товаре из JS: {product.name}")
+            return product
         
         except Exception as e:
             logger.error(f"Ошибка при обработке данных из JS: {e}")
@@ -267,192 +874,270 @@ class UzumParser:
     
     def _parse_html(self, driver, product_url):
         """Парсинг HTML-страницы товара"""
+        with span('html_parse'):
+            return self._parse_html_source(driver.page_source, product_url)
+    
+    def _parse_html_source(self, html, product_url):
+        """Парсинг HTML товара: один разбор документа и один проход по скомпилированным селекторам"""
         logger.info("Парсинг HTML-страницы товара")
         
-        product_data = {
-            'name': 'Название не найдено',
-            'description': 'Описание отсутствует',
-            'price': 'Цена не указана',
-            'price_raw': 0,
-            'images': [],
-            'images_str': '',
-            'colors': [],
-            'colors_str': '',
-            'availability': True,
-            'url': product_url
-        }
+        name = description = price_text = None
+        price_raw = 0
+        images = []
+        colors = []
         
         try:
-            # Используем BeautifulSoup для парсинга
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            fields = product_selectors.extract(parse_document(html))
             
             # Название товара
-            title_selectors = [
-                'h1.title', 'h1.product-title', '.product-title', '.product-name',
-                'h1[itemprop="name"]', '.product-info h1', '.product-detail h1'
-            ]
-            
-            for selector in title_selectors:
-                title_element = soup.select_one(selector)
-                if title_element and title_element.text.strip():
-                    product_data['name'] = title_element.text.strip()
-                    logger.info(f"Найдено название товара: {product_data['name']}")
-                    break
+            if fields['name']:
+                name = fields['name']
+                logger.info(f"Найдено название товара: {name}")
             
             # Описание товара
-            description_selectors = [
-                '.product-description', '.description', '[itemprop="description"]',
-                '.product-details', '.product-info .description', '.details-container'
-            ]
-            
-            for selector in description_selectors:
-                desc_element = soup.select_one(selector)
-                if desc_element and desc_element.text.strip():
-                    product_data['description'] = desc_element.text.strip()
-                    logger.info(f"Найдено описание товара (первые 50 символов): {product_data['description'][:50]}...")
-                    break
-            
-            # Цена товара
-            price_selectors = [
-                '.product-price', '.price', '[itemprop="price"]',
-                '.current-price', '.price-current', '.product-info .price'
-            ]
+            if fields['description']:
+                description = fields['description']
+                logger.info(f"Найдено описание товара (первые 50 символов): {description[:50]}...")
             
-            for selector in price_selectors:
-                price_element = soup.select_one(selector)
-                if price_element and price_element.text.strip():
-                    price_text = price_element.text.strip()
-                    product_data['price'] = price_text
-                    
-                    # Попытка извлечь числовое значение цены
-                    price_digits = re.sub(r'[^\d]', '', price_text)
-                    if price_digits:
-                        try:
-                            product_data['price_raw'] = int(price_digits)
-                        except ValueError:
-                            pass
-                    
-                    logger.info(f"Найдена цена товара: {product_data['price']}")
-                    break
+            # Цена товара: строка сохраняется в том виде, как на странице
+            if fields['price']:
+                price_text = fields['price']
+                
+                # Попытка извлечь числовое значение цены
+                price_digits = re.sub(r'[^\d]', '', price_text)
+                if price_digits:
+                    price_raw = int(price_digits)
+                
+                logger.info(f"Найдена цена товара: {price_text}")
             
             # Изображения товара
-            image_selectors = [
-                '.product-gallery img', '.product-images img', '.gallery img',
-                '.product-photo img', '.swiper-slide img'
-            ]
-            
-            for selector in image_selectors:
-                img_elements = soup.select(selector)
-                if img_elements:
-                    for img in img_elements:
-                        img_url = img.get('src') or img.get('data-src')
-                        if img_url:
-                            # Нормализуем URL
-                            if img_url.startswith('//'):
-                                img_url = 'https:' + img_url
-                            elif img_url.startswith('/'):
-                                img_url = urljoin(self.base_url, img_url)
-                            
-                            product_data['images'].append(img_url)
-                    
-                    product_data['images_str'] = ','.join(product_data['images'])
-                    logger.info(f"Найдено {len(product_data['images'])} изображений товара")
-                    break
+            if fields['images']:
+                images = self.images.process(img.get('src') or img.get('data-src') for img in fields['images'])
+                logger.info(f"Найдено {len(images)} изображений товара")
             
             # Если не нашли изображения через селекторы, ищем через метатеги
-            if not product_data['images']:
-                meta_img = soup.select_one('meta[property="og:image"]')
-                if meta_img and meta_img.get('content'):
-                    img_url = meta_img.get('content')
-                    # Нормализуем URL
-                    if img_url.startswith('//'):
-                        img_url = 'https:' + img_url
-                    elif img_url.startswith('/'):
-                        img_url = urljoin(self.base_url, img_url)
-                    
-                    product_data['images'].append(img_url)
-                    product_data['images_str'] = img_url
-                    logger.info(f"Найдено изображение товара через метатег: {img_url}")
+            if not images and fields['og_image']:
+                images = self.images.process([fields['og_image'][0].get('content')])
+                if images:
+                    logger.info(f"Найдено изображение товара через метатег: {images[0]}")
             
-            # Попытка найти цвета
-            color_selectors = [
-                '.colors-list .color-item', '.color-options .color-option',
-                '.color-selector .color'
-            ]
-            
-            for selector in color_selectors:
-                color_elements = soup.select(selector)
-                if color_elements:
-                    for elem in color_elements:
-                        color_name = elem.get('title') or elem.get('data-color') or elem.text.strip()
-                        if color_name:
-                            product_data['colors'].append({
-                                'name': color_name,
-                                'id': elem.get('data-id', '')
-                            })
-                    
-                    product_data['colors_str'] = ','.join([c['name'] for c in product_data['colors']])
-                    logger.info(f"Найдено {len(product_data['colors'])} цветов товара")
-                    break
-            
-            return product_data
+            # Цвета товара
+            if fields['colors']:
+                for elem in fields['colors']:
+                    color_name = elem.get('title') or elem.get('data-color') or elem.text.strip()
+                    if color_name:
+                        colors.append((color_name, elem.get('data-id', '')))
+                
+                logger.info(f"Найдено {len(colors)} цветов товара")
             
         except Exception as e:
             logger.error(f"Ошибка при парсинге HTML: {e}")
-            return product_data
+            record_failure('html_parse')
+        
+        return Product(
+            url=product_url,
+            name=name,
+            description=description,
+            price_raw=price_raw,
+            images=images,
+            colors=colors,
+            price_text=price_text
+        )
     
     def get_shop_products(self, shop_url, limit=None, max_pages=None):
         """Получение ссылок на товары из магазина с поддержкой пагинации"""
+        return list(self.iter_shop_products(shop_url, limit=limit, max_pages=max_pages))
+    
+    def iter_shop_products(self, shop_url, limit=None, max_pages=None):
+        """Потоковое получение ссылок на товары магазина в порядке обнаружения
+        
+        Ссылки выдаются по мере обхода страниц без дубликатов, а пагинация
+        останавливается, как только набрано limit ссылок. Браузер остается
+        занятым, пока генератор не исчерпан или не закрыт.
+        """
+        for listing in self.iter_shop_listings(shop_url, limit=limit, max_pages=max_pages):
+            yield listing['url']
+    
+    def iter_shop_listings(self, shop_url, limit=None, max_pages=None, state=None):
+        """Потоковое получение карточек товаров магазина (ссылка, ID, название, цена, изображения)
+        
+        Сначала товары запрашиваются через API каталога большими страницами,
+        при его недоступности магазин обходится в браузере кликами по пагинации.
+        Если передан state (ShopCrawlState), в нем отражаются текущая страница
+        и итог обхода: завершен полностью или прерван ошибкой. Обход продолжается
+        с контрольной точки state (start_page), ссылки из state.seen_links пропускаются.
+        """
         if not shop_url:
             logger.error("URL магазина не определен")
-            return []
+            return
         
         logger.info(f"Получение товаров из магазина: {shop_url}")
         
         # Извлекаем ID магазина или имя из URL
         shop_id = shop_url.split('/')[-1].split('?')[0]
+        state = state or ShopCrawlState(shop_id)
+        seen_links = state.seen_links
+        
+        if self.pagination != 'dom':
+            done = yield from self._iter_shop_listings_api(shop_url, shop_id, limit, max_pages, state, seen_links)
+            if done:
+                return
+            if self.pagination == 'api':
+                state.failed = True
+                return
+            logger.warning(f"API каталога недоступно, обход магазина {shop_id} через страницы")
+        
+        yield from self._iter_shop_listings_dom(shop_url, shop_id, limit, max_pages, state, seen_links)
+    
+    def _iter_shop_listings_api(self, shop_url, shop_id, limit, max_pages, state, seen_links):
+        """Карточки магазина через API каталога; возвращает False, если API не сработало
+        
+        После первой страницы известно общее число товаров, и остальные страницы
+        загружаются параллельно. Страницы API крупнее страниц сайта, max_pages
+        ограничивает именно их.
+        """
+        client = self.listing_client
+        product_base_url = shop_product_base(shop_url)
+        
+        def emit(items):
+            listings = self._api_listings(items, product_base_url, shop_id, limit, state, seen_links)
+            self._refresh_cached_prices(listings)
+            yield from listings
+        
+        # Страницы API нумеруются с нуля
+        first_page = state.resume_page('api') - 1
+        try:
+            with span('listing_api_page'):
+                items, total = client.fetch_page(shop_id, first_page)
+            if not items and not total:
+                # Пустой ответ не отличить от неверного ID магазина - проверяем страницами сайта
+                logger.warning(f"API каталога не вернуло товаров магазина {shop_id}")
+                return False
+            
+            logger.info(f"API каталога: {total if total is not None else 'неизвестно'} товаров в магазине {shop_id}")
+            yield from emit(items)
+            if state.truncated:
+                return True
+            
+            if total is not None:
+                pages_needed = client.page_count(total)
+                if limit:
+                    pages_needed = min(pages_needed, client.page_count(limit))
+                if max_pages and max_pages < pages_needed:
+                    pages_needed = max_pages
+                    state.truncated = True
+                # Замеряется только загрузка страниц: время потребителя карточек в стадию не входит
+                pages = client.iter_pages(shop_id, list(range(first_page + 1, pages_needed)))
+                for page, items in timed_iter(pages, 'listing_api_pages'):
+                    state.page = page + 1
+                    yield from emit(items)
+                    if limit and len(seen_links) >= limit:
+                        return True
+            else:
+                # Общее число неизвестно - страницы по одной, пока не придет неполная
+                page = first_page
+                while len(items) >= client.page_size:
+                    if max_pages and page + 1 >= max_pages:
+                        state.truncated = True
+                        break
+                    page += 1
+                    state.page = page + 1
+                    with span('listing_api_page'):
+                        items, _ = client.fetch_page(shop_id, page)
+                    yield from emit(items)
+                    if limit and len(seen_links) >= limit:
+                        return True
+            
+            logger.info(f"Всего найдено {len(seen_links)} уникальных ссылок на товары в магазине {shop_id} через API")
+            return True
         
-        driver = self._setup_selenium()
+        except Exception as e:
+            logger.error(f"Ошибка при получении товаров магазина через API каталога: {e}")
+            record_failure('listing_api')
+            state.truncated = False
+            return False
+    
+    def _api_listings(self, items, product_base_url, shop_id, limit, state, seen_links):
+        """Новые карточки из страницы API; при наборе limit обход помечается усеченным"""
+        listings = []
+        for item in items:
+            card = listing_card(item, product_base_url)
+            if not card or card['url'] in seen_links:
+                continue
+            seen_links.add(card['url'])
+            state.count += 1
+            listings.append(self._build_listing(card))
+            if limit and len(seen_links) >= limit:
+                logger.info(f"Набрано {limit} ссылок, обход магазина {shop_id} остановлен")
+                state.truncated = True
+                break
+        return listings
+    
+    def _iter_shop_listings_dom(self, shop_url, shop_id, limit, max_pages, state, seen_links):
+        """Карточки магазина обходом страниц в браузере с кликами по пагинации"""
+        driver = self._acquire_driver()
         if not driver:
-            logger.error("Не удалось инициализировать Selenium")
-            return []
+            state.failed = True
+            return
         
-        all_product_links = []
         current_page = 1
+        start_page = state.resume_page('dom')
+        failed = False
         
         try:
             # Загружаем первую страницу
             logger.info(f"Загрузка первой страницы магазина: {shop_url}")
-            driver.get(shop_url)
+            baseline = self._open_page(driver, shop_url)
             
             # Ждем загрузки страницы
-            wait_time = 5
-            logger.info(f"Ожидание {wait_time} секунд для полной загрузки страницы")
-            time.sleep(wait_time)
+            self._wait_for_page(driver, 'shop', SHOP_READY_JS, None)
+            self._report_page_load(driver, 'shop', baseline)
             
             # Цикл по страницам магазина
             while True:
-                logger.info(f"Обработка страницы {current_page} магазина {shop_id}")
-                
-                # Прокручиваем страницу вниз для загрузки всех товаров (ленивая загрузка)
-                self._scroll_page(driver)
+                page_cards = []
+                if current_page < start_page:
+                    # Страница обработана до контрольной точки: только переходим дальше
+                    logger.info(f"Пропуск страницы {current_page} магазина {shop_id}, продолжаем с {start_page}")
+                else:
+                    state.page = current_page
+                    logger.info(f"Обработка страницы {current_page} магазина {shop_id}")
+                    
+                    # Прокручиваем страницу вниз для загрузки всех товаров (ленивая загрузка)
+                    with span('shop_scroll'):
+                        self._scroll_page(driver)
+                    
+                    # Ищем карточки товаров на текущей странице
+                    try:
+                        # Пытаемся найти через JavaScript
+                        with span('shop_cards_js'):
+                            page_cards = self._extract_product_cards_js(driver)
+                        if page_cards:
+                            logger.info(f"Найдено {len(page_cards)} ссылок на товары через JavaScript на странице {current_page}")
+                    except Exception as e:
+                        logger.error(f"Ошибка при извлечении ссылок через JavaScript: {e}")
+                    
+                    # Если через JavaScript не нашли, парсим HTML
+                    if not page_cards:
+                        with span('shop_cards_html'):
+                            page_cards = self._extract_product_cards_html(driver)
+                        if page_cards:
+                            logger.info(f"Найдено {len(page_cards)} ссылок на товары через HTML на странице {current_page}")
                 
-                # Ищем ссылки на товары на текущей странице
-                try:
-                    # Пытаемся найти через JavaScript
-                    js_links = self._extract_product_links_js(driver)
-                    if js_links:
-                        all_product_links.extend(js_links)
-                        logger.info(f"Найдено {len(js_links)} ссылок на товары через JavaScript на странице {current_page}")
-                except Exception as e:
-                    logger.error(f"Ошибка при извлечении ссылок через JavaScript: {e}")
+                self._refresh_cached_prices(page_cards)
                 
-                # Если через JavaScript не нашли, парсим HTML
-                if not js_links:
-                    html_links = self._extract_product_links_html(driver)
-                    if html_links:
-                        all_product_links.extend(html_links)
-                        logger.info(f"Найдено {len(html_links)} ссылок на товары через HTML на странице {current_page}")
+                # Отдаем новые карточки сразу, не дожидаясь конца обхода
+                for card in page_cards:
+                    if card['url'] in seen_links:
+                        continue
+                    seen_links.add(card['url'])
+                    state.count += 1
+                    yield card
+                    
+                    if limit and len(seen_links) >= limit:
+                        logger.info(f"Набрано {limit} ссылок, обход магазина {shop_id} остановлен")
+                        state.truncated = True
+                        return
                 
                 # Проверяем, есть ли следующая страница
                 next_page_exists = False
@@ -483,10 +1168,13 @@ class UzumParser:
                 
                 if max_pages and current_page >= max_pages:
                     logger.info(f"Достигнуто максимальное количество страниц ({max_pages})")
+                    state.truncated = True
                     break
                 
                 # Переходим на следующую страницу
                 try:
+                    # Запоминаем текущее содержимое сетки, чтобы дождаться его смены после клика
+                    grid_signature = driver.execute_script(SHOP_READY_JS, None)
                     success = driver.execute_script("""
                         const paginationElements = document.querySelectorAll('.pagination a, .page-navigation a, .pager a');
                         for (const elem of paginationElements) {
@@ -506,22 +1194,779 @@ class UzumParser:
                     if success:
                         current_page += 1
                         logger.info(f"Переход на страницу {current_page}")
-                        # Ждем загрузки следующей страницы
-                        time.sleep(wait_time)
+                        # Ждем, пока сетка товаров сменится на следующую страницу
+                        grid_signature = self._wait_for_page(
+                            driver, 'shop_page', SHOP_READY_JS, grid_signature or None
+                        )
                     else:
                         logger.warning("Не удалось перейти на следующую страницу")
+                        state.failed = True
                         break
                 except Exception as e:
                     logger.error(f"Ошибка при переходе на следующую страницу: {e}")
+                    state.failed = True
                     break
             
-            # Удаляем дубликаты
-            all_product_links = list(set(all_product_links))
-            logger.info(f"Всего найдено {len(all_product_links)} уникальных ссылок на товары в магазине {shop_id}")
+            logger.info(f"Всего найдено {len(seen_links)} уникальных ссылок на товары в магазине {shop_id}")
+        
+        except Exception as e:
+            logger.error(f"Ошибка при получении товаров из магазина: {e}")
+            record_failure('shop_crawl')
+            failed = True
+            state.failed = True
+        finally:
+            self._release_driver(driver, failed)
+    
+    def _scroll_page(self, driver, max_scrolls=10, pause=1):
+        """Прокрутка страницы вниз для подгрузки товаров (ленивая загрузка)"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        
+        try:
+            last_height = driver.execute_script("return document.body.scrollHeight")
+            for _ in range(max_scrolls):
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                # Ждем подгрузки новых товаров не дольше pause секунд
+                try:
+                    WebDriverWait(driver, pause, poll_frequency=PAGE_WAIT_POLL).until(
+                        lambda d: d.execute_script("return document.body.scrollHeight") != last_height
+                    )
+                except TimeoutException:
+                    break
+                last_height = driver.execute_script("return document.body.scrollHeight")
+        except Exception as e:
+            logger.error(f"Ошибка при прокрутке страницы: {e}")
+    
+    def _extract_product_cards_js(self, driver):
+        """Извлечение карточек товаров через JavaScript"""
+        cards = driver.execute_script("""
+            const cards = [];
+            const seen = new Set();
+            document.querySelectorAll('a[href*="/product/"]').forEach(a => {
+                const url = a.href ? a.href.split('?')[0] : '';
+                if (!url || seen.has(url)) return;
+                seen.add(url);
+                
+                const card = a.closest('[data-test-id*="product-card"], .product-card, article, li') || a;
+                const text = (card.innerText || '').replace(/\\u00a0/g, ' ');
+                const price = text.match(/(\\d[\\d ]*)\\s*сум/i);
+                const title = card.querySelector('[data-test-id*="title"], .product-card__title, .title');
+                const images = Array.from(card.querySelectorAll('img'))
+                    .map(img => img.currentSrc || img.src || img.dataset.src)
+                    .filter(Boolean);
+                
+                cards.push({
+                    url: url,
+                    title: (title && title.textContent.trim()) || a.title || (card.querySelector('img') || {}).alt || '',
+                    price_text: price ? price[1] : '',
+                    images: images,
+                    unavailable: /нет в наличии|mavjud emas|out of stock/i.test(text)
+                });
+            });
+            return cards;
+        """)
+        return [self._build_listing(card) for card in cards or []]
+    
+    def _extract_product_cards_html(self, driver):
+        """Извлечение карточек товаров из HTML"""
+        from bs4 import BeautifulSoup
+        
+        cards = []
+        seen = set()
+        try:
+            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            for a in soup.select('a[href*="/product/"]'):
+                href = a.get('href')
+                if not href:
+                    continue
+                url = urljoin(self.base_url, href).split('?')[0]
+                if url in seen:
+                    continue
+                seen.add(url)
+                
+                img = a.find('img')
+                cards.append(self._build_listing({
+                    'url': url,
+                    'title': a.get('title') or (img.get('alt') if img else '') or a.text.strip(),
+                    'images': [img.get('src') or img.get('data-src')] if img else [],
+                }))
+        except Exception as e:
+            logger.error(f"Ошибка при извлечении ссылок через HTML: {e}")
+        return cards
+    
+    def _refresh_cached_prices(self, listings):
+        """Цена и наличие из карточек магазина обновляют кэш товаров без загрузки их страниц"""
+        if self.cache is None:
+            return
+        updates = [
+            (listing['product_id'], {
+                'price': Product.format_price(listing['price_raw']),
+                'price_raw': listing['price_raw'],
+                'availability': listing['availability'],
+            })
+            for listing in listings if listing['product_id'] and listing['price_raw']
+        ]
+        if updates:
+            updated = self.cache.update_volatile_many(updates)
+            if updated:
+                logger.info(f"Обновлены цены {updated} товаров в кэше по карточкам магазина")
+    
+    def _build_listing(self, card):
+        """Нормализация данных карточки товара из списка магазина"""
+        price_digits = re.sub(r'[^\d]', '', card.get('price_text') or '')
+        return {
+            'url': card['url'],
+            'product_id': self._extract_product_id(card['url']),
+            'title': card.get('title') or '',
+            'price_raw': int(price_digits) if price_digits else None,
+            'availability': not card.get('unavailable', False),
+            'images': self.images.process(card.get('images') or []),
+        }
+
+
+class AsyncUzumParser(UzumParser):
+    """UzumParser на asyncio: много товаров и страниц магазина одновременно в одном цикле
+    
+    Товары загружаются через aiohttp, отрисовка идет во вкладках общего браузера
+    по DevTools, а не в отдельном Chrome на каждую страницу. Каждый товар
+    ограничен task_timeout секундами. Синхронные методы сохраняют сигнатуры
+    UzumParser и выполняют корутины в общем цикле процесса.
+    """
+    
+    def __init__(self, pool=None, wait_timeout=None, fetch_mode=None, cache=None, pagination=None,
+                 http=None, browser=None, loop=None, task_timeout=None):
+        super().__init__(pool, wait_timeout, fetch_mode, cache, pagination)
+        self.http = http or async_http
+        self.browser = browser or async_browser
+        self.loop = loop or async_loop
+        self.task_timeout = ASYNC_TASK_TIMEOUT if task_timeout is None else task_timeout
+    
+    def get_product_details(self, product_url, mode=None):
+        return self.loop.run(self.get_product_details_async(product_url, mode=mode))
+    
+    def iter_products_details(self, product_urls, concurrency=None, mode=None):
+        return self.loop.iterate(self.iter_products_details_async(product_urls, concurrency=concurrency, mode=mode))
+    
+    def iter_shop_listings(self, shop_url, limit=None, max_pages=None, state=None):
+        return self.loop.iterate(self.iter_shop_listings_async(shop_url, limit=limit, max_pages=max_pages, state=state))
+    
+    async def get_product_details_async(self, product_url, mode=None):
+        """Получение информации о товаре: сначала по HTTP, при неудаче во вкладке браузера"""
+        if not product_url:
+            logger.error("URL товара не определен")
+            return None
+        
+        try:
+            with span('product'):
+                product_data = await asyncio.wait_for(self._fetch_product_async(product_url, mode), self.task_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Товар не получен за {self.task_timeout} секунд: {product_url}")
+            product_data = None
+        EXTRACTION_TOTAL.labels(product_data.source if product_data else 'failed').inc()
+        return product_data
+    
+    async def _fetch_product_async(self, product_url, mode):
+        """То же, что _fetch_product: кэш, HTTP, затем отрисовка"""
+        product_id = self._extract_product_id(product_url)
+        cached = None
+        if self.cache is not None and product_id:
+            with span('cache_lookup'):
+                cached = await asyncio.to_thread(self.cache.get, product_id)
+            if cached and cached.fresh:
+                logger.info(f"Товар {product_id} получен из кэша")
+                return Product.from_dict(cached.product, url=product_url, source='cache')
+        
+        mode = mode or self.fetch_mode
+        if mode in ('auto', 'http'):
+            product_data, validators = await self._get_product_details_http_async(
+                product_url, cached.validators if cached else None
+            )
+            if product_data is None and validators is not None and cached:
+                logger.info(f"Товар {product_id} не изменился, продлеваем запись кэша")
+                await asyncio.to_thread(
+                    self.cache.revalidate, product_id, validators.get('etag'), validators.get('last_modified')
+                )
+                return Product.from_dict(cached.product, url=product_url, source='cache_revalidated')
+            if product_data:
+                await asyncio.to_thread(self._store_in_cache, product_id, product_data, validators)
+                return product_data
+            if mode == 'http':
+                return None
+            logger.info(f"Не удалось получить данные по HTTP, открываем вкладку браузера: {product_url}")
+        
+        product_data = await self._get_product_details_cdp(product_url)
+        if product_data and product_data.source == 'cdp_js':
+            await asyncio.to_thread(self._store_in_cache, product_id, product_data)
+        return product_data
+    
+    async def _get_product_details_http_async(self, product_url, conditional_headers=None):
+        """То же, что _get_product_details_http, через aiohttp"""
+        logger.info(f"Загрузка страницы товара по HTTP: {product_url}")
+        try:
+            with span('http_fetch'):
+                response = await self.http.get(product_url, headers=conditional_headers or None)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке страницы товара по HTTP: {e}")
+            return None, None
+        # Разбор HTML в потоке, чтобы не задерживать остальные запросы цикла
+        return await asyncio.to_thread(self._product_from_response, product_url, response, conditional_headers)
+    
+    async def _get_product_details_cdp(self, product_url):
+        """Получение информации о товаре во вкладке браузера через DevTools"""
+        logger.info(f"Загрузка страницы товара через DevTools: {product_url}")
+        host = urlparse(product_url).hostname
+        try:
+            # Браузер делит лимит запросов к хосту с HTTP-клиентом
+            if self.http.limiter is not None and host and not await self.http.acquire(host):
+                raise RuntimeError(f"Не дождались лимита запросов к {host}")
+            
+            async with self.browser.tab() as tab:
+                with span('navigation'):
+                    await tab.navigate(product_url)
+                
+                started = time.monotonic()
+                with span('wait_product'):
+                    ready = await tab.wait_for(PRODUCT_READY_JS, self.wait_timeout, PAGE_WAIT_POLL)
+                wait_stats.record('product', time.monotonic() - started, ready is not None)
+                
+                with span('js_extract'):
+                    data = await tab.evaluate(PRODUCT_STATE_JS)
+                product_data = self._process_js_data(data) if data else None
+                if product_data:
+                    product_data.url = product_url
+                    product_data.source = 'cdp_js'
+                    return product_data
+                
+                record_failure('js_extract')
+                html = await tab.content()
             
-            # Ограничиваем количество ссылок, если нужно
-            if limit and len(all_product_links) > limit:
-                all_product_links = all_product_links[:limit]
-                logger.info(f"Ограничено количество ссылок до {limit}")
+            with span('html_parse'):
+                product_data = await asyncio.to_thread(self._parse_html_source, html, product_url)
+            product_data.source = 'cdp_html'
+            return product_data
+        
+        except Exception as e:
+            logger.error(f"Ошибка при получении данных о товаре через DevTools: {e}")
+            record_failure('cdp_product')
+            return None
+    
+    async def _get_product_result_async(self, index, product_url, mode):
+        try:
+            product_data = await self.get_product_details_async(product_url, mode=mode)
+            error = None if product_data else 'Не удалось получить данные о товаре'
+        except Exception as e:
+            logger.error(f"Ошибка при получении товара {product_url}: {e}")
+            product_data = None
+            error = str(e)
+        return {'index': index, 'url': product_url, 'product': product_data, 'error': error}
+    
+    async def _aiter_urls(self, product_urls):
+        """Ссылки из списка, асинхронного или обычного генератора (его шаги выполняются в потоке)"""
+        if hasattr(product_urls, '__aiter__'):
+            async for url in product_urls:
+                yield url
+        elif isinstance(product_urls, (list, tuple)):
+            for url in product_urls:
+                yield url
+        else:
+            iterator = iter(product_urls)
+            done = object()
+            while True:
+                url = await asyncio.to_thread(next, iterator, done)
+                if url is done:
+                    return
+                yield url
+    
+    async def iter_products_details_async(self, product_urls, concurrency=None, mode=None):
+        """Одновременное получение товаров; результаты выдаются по мере готовности
+        
+        Одновременно обрабатывается до concurrency товаров (по умолчанию ASYNC_CONCURRENCY).
+        """
+        concurrency = max(1, concurrency or ASYNC_CONCURRENCY)
+        logger.info(f"Пакетное получение товаров в цикле asyncio, одновременно: {concurrency}")
+        
+        urls = self._aiter_urls(product_urls)
+        pending = set()
+        try:
+            index = 0
+            async for url in urls:
+                pending.add(asyncio.ensure_future(self._get_product_result_async(index, url, mode)))
+                index += 1
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
             
-            return all_product_links
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Если потребитель прервал итерацию, незавершенные товары отменяются
+            for task in pending:
+                task.cancel()
+            await urls.aclose()
+    
+    async def get_products_details_async(self, product_urls, concurrency=None, mode=None, ordered=True):
+        results = [result async for result in self.iter_products_details_async(product_urls, concurrency, mode)]
+        if ordered:
+            results.sort(key=lambda item: item['index'])
+        return results
+    
+    async def iter_shop_listings_async(self, shop_url, limit=None, max_pages=None, state=None):
+        """Карточки товаров магазина, как iter_shop_listings
+        
+        Страницы API каталога загружаются в цикле; обход страниц сайта при
+        недоступности API выполняется в Selenium в отдельном потоке.
+        """
+        if not shop_url:
+            logger.error("URL магазина не определен")
+            return
+        
+        logger.info(f"Получение товаров из магазина: {shop_url}")
+        shop_id = shop_url.split('/')[-1].split('?')[0]
+        state = state or ShopCrawlState(shop_id)
+        seen_links = state.seen_links
+        
+        if self.pagination != 'dom':
+            product_base_url = shop_product_base(shop_url)
+            pages = self._iter_listing_pages_async(shop_id, limit, max_pages, state)
+            done = False
+            try:
+                async for items in pages:
+                    listings = self._api_listings(items, product_base_url, shop_id, limit, state, seen_links)
+                    await asyncio.to_thread(self._refresh_cached_prices, listings)
+                    for listing in listings:
+                        yield listing
+                    if limit and len(seen_links) >= limit:
+                        break
+                done = True
+                logger.info(f"Всего найдено {len(seen_links)} уникальных ссылок на товары в магазине {shop_id} через API")
+            except Exception as e:
+                logger.error(f"Ошибка при получении товаров магазина через API каталога: {e}")
+                record_failure('listing_api')
+                state.truncated = False
+            finally:
+                await pages.aclose()
+            if done:
+                return
+            if self.pagination == 'api':
+                state.failed = True
+                return
+            logger.warning(f"API каталога недоступно, обход магазина {shop_id} через страницы")
+        
+        dom = self._iter_shop_listings_dom(shop_url, shop_id, limit, max_pages, state, seen_links)
+        try:
+            end = object()
+            while True:
+                listing = await asyncio.to_thread(next, dom, end)
+                if listing is end:
+                    return
+                yield listing
+        finally:
+            await asyncio.to_thread(dom.close)
+    
+    async def _iter_listing_pages_async(self, shop_id, limit, max_pages, state):
+        """Списки товаров по страницам API каталога; пустой магазин считается ошибкой API"""
+        client = self.listing_client
+        first_page = state.resume_page('api') - 1
+        with span('listing_api_page'):
+            items, total = await client.fetch_page_async(shop_id, first_page)
+        if not items and not total:
+            raise ListingApiError(f"API каталога не вернуло товаров магазина {shop_id}")
+        
+        logger.info(f"API каталога: {total if total is not None else 'неизвестно'} товаров в магазине {shop_id}")
+        yield items
+        
+        if total is not None:
+            pages_needed = client.page_count(total)
+            if limit:
+                pages_needed = min(pages_needed, client.page_count(limit))
+            if max_pages and max_pages < pages_needed:
+                pages_needed = max_pages
+                state.truncated = True
+            pages = timed_aiter(client.iter_pages_async(shop_id, list(range(first_page + 1, pages_needed))),
+                                'listing_api_pages')
+            try:
+                async for page, items in pages:
+                    state.page = page + 1
+                    yield items
+            finally:
+                await pages.aclose()
+        else:
+            page = first_page
+            while len(items) >= client.page_size:
+                if max_pages and page + 1 >= max_pages:
+                    state.truncated = True
+                    break
+                page += 1
+                state.page = page + 1
+                with span('listing_api_page'):
+                    items, _ = await client.fetch_page_async(shop_id, page)
+                yield items
+
+
+def _prepare_tab(driver):
+    """Новая вкладка получает ту же блокировку ресурсов, что и основная"""
+    if LEAN_BROWSING:
+        set_resource_blocking(driver, LEAN_BLOCKED_PATTERNS)
+
+
+def _navigate_tab(driver, url):
+    """Переход во вкладке; в экономном режиме иногда без блокировки для контрольного замера"""
+    baseline = False
+    if LEAN_BROWSING:
+        baseline = lean_stats.next_is_baseline(LEAN_BASELINE_EVERY)
+        if baseline:
+            set_resource_blocking(driver, [])
+    with span('navigation'):
+        driver.execute_cdp_cmd('Page.navigate', {'url': url})
+    return baseline
+
+
+def _throttle_tab(url):
+    """Вкладки делят лимит запросов к хосту с HTTP-клиентом"""
+    host = urlparse(url).hostname
+    return rate_limiter.try_acquire(host) if rate_limiter is not None and host else 0
+
+
+# Общая очередь вкладок процесса: товары отрисовываются параллельно в одном Chrome из пула
+tab_scheduler = TabScheduler(
+    driver_pool,
+    PRODUCT_READY_JS,
+    lambda driver, url, ready, waited, baseline: UzumParser(tabs=False)._harvest_tab(
+        driver, url, ready, waited, baseline
+    ),
+    tabs=BROWSER_TABS,
+    page_timeout=PAGE_WAIT_TIMEOUT,
+    # Страница из очереди должна успеть загрузиться до истечения TAB_TIMEOUT
+    queue_timeout=max(1.0, TAB_TIMEOUT - PAGE_WAIT_TIMEOUT),
+    poll=PAGE_WAIT_POLL,
+    max_tab_pages=TAB_MAX_PAGES,
+    max_tab_heap_mb=TAB_MAX_HEAP_MB,
+    prepare_tab=_prepare_tab,
+    navigate=_navigate_tab,
+    throttle=_throttle_tab,
+    on_event=lambda event: TAB_EVENTS.labels(event).inc()
+) if BROWSER_TABS > 1 else None
+
+
+def make_parser():
+    """Парсер движка из PARSER_ENGINE"""
+    if PARSER_ENGINE == 'async':
+        return AsyncUzumParser()
+    return UzumParser()
+
+
+def close_async_engine():
+    """Закрытие сессии aiohttp и браузера DevTools, если цикл asyncio запускался"""
+    if not async_loop.started:
+        return
+    try:
+        async_loop.run(async_http.close(), timeout=10)
+        async_loop.run(async_browser.close(), timeout=15)
+    except Exception as e:
+        logger.error(f"Ошибка при закрытии движка asyncio: {e}")
+
+
+def _int_arg(name):
+    """Чтение целочисленного параметра запроса"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _result_to_dict(result):
+    """Результат пакета с товаром в виде словаря (для JSON)"""
+    product = result['product']
+    return dict(result, product=product.to_dict() if product else None)
+
+
+def _run_shop_job(context, params):
+    """Задание: обход магазина, при with_details вместе с данными товаров
+    
+    Прерванный обход того же магазина продолжается с контрольной точки (resume=false - заново).
+    """
+    crawler = ResumableCrawler(make_parser(), checkpoint_store, flush_every=CHECKPOINT_EVERY)
+    with_details = bool(params.get('with_details'))
+    for result in crawler.crawl(
+        params['url'],
+        limit=params.get('limit'),
+        max_pages=params.get('max_pages'),
+        with_details=with_details,
+        concurrency=params.get('concurrency'),
+        resume=params.get('resume') is not False
+    ):
+        context.add_result(_result_to_dict(result) if with_details else result)
+
+
+def _run_products_job(context, params):
+    """Задание: пакетное получение товаров"""
+    parser = make_parser()
+    context.set_total(len(params['urls']))
+    for result in parser.iter_products_details(
+        params['urls'], concurrency=params.get('concurrency'), mode=params.get('mode')
+    ):
+        context.add_result(_result_to_dict(result))
+
+
+def _run_incremental_job(context, params):
+    """Задание: инкрементальный обход магазина, результат - список изменений"""
+    crawler = IncrementalCrawler(make_parser(), crawl_state_store)
+    diff = crawler.crawl(
+        params['url'], max_pages=params.get('max_pages'), concurrency=params.get('concurrency')
+    )
+    for change in ('added', 'changed', 'price_changed', 'removed'):
+        for item in diff[change]:
+            context.add_result(dict(item, change=change))
+
+
+crawl_state_store = CrawlStateStore(data_path('crawl_state.sqlite3'))
+checkpoint_store = CheckpointStore(data_path('checkpoints.sqlite3'), max_age=CHECKPOINT_MAX_AGE)
+
+job_manager = JobManager(JobStore(data_path('jobs.sqlite3')), workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE)
+job_manager.register('shop', _run_shop_job)
+job_manager.register('products', _run_products_job)
+job_manager.register('shop_incremental', _run_incremental_job)
+
+
+@app.route('/api/product', methods=['GET'])
+def api_product():
+    """Получение информации о товаре по URL"""
+    product_url = request.args.get('url')
+    if not product_url:
+        return jsonify({'error': 'Не указан параметр url'}), 400
+    
+    mode = request.args.get('mode')
+    if mode and mode not in FETCH_MODES:
+        return jsonify({'error': 'Параметр mode должен быть auto, http или selenium'}), 400
+    
+    parser = make_parser()
+    product_data = parser.get_product_details(product_url, mode=mode)
+    if not product_data:
+        return jsonify({'error': 'Не удалось получить данные о товаре'}), 502
+    return jsonify(product_data.to_dict())
+
+
+@app.route('/api/shop', methods=['GET'])
+def api_shop():
+    """Получение ссылок на товары магазина"""
+    shop_url = request.args.get('url')
+    if not shop_url:
+        return jsonify({'error': 'Не указан параметр url'}), 400
+    
+    parser = make_parser()
+    links = parser.get_shop_products(shop_url, limit=_int_arg('limit'), max_pages=_int_arg('max_pages'))
+    return jsonify({'shop_url': shop_url, 'count': len(links), 'products': links})
+
+
+@app.route('/api/products', methods=['POST'])
+def api_products():
+    """Пакетное получение информации о товарах"""
+    payload = request.get_json(silent=True) or {}
+    product_urls = payload.get('urls')
+    if not product_urls or not isinstance(product_urls, list):
+        return jsonify({'error': 'Не указан список urls'}), 400
+    
+    mode = payload.get('mode')
+    if mode and mode not in FETCH_MODES:
+        return jsonify({'error': 'Параметр mode должен быть auto, http или selenium'}), 400
+    
+    parser = make_parser()
+    results = parser.get_products_details(
+        product_urls,
+        concurrency=payload.get('concurrency'),
+        mode=mode,
+        ordered=payload.get('ordered', True)
+    )
+    return jsonify({'count': len(results), 'results': [_result_to_dict(result) for result in results]})
+
+
+@app.route('/api/jobs', methods=['POST'])
+def api_jobs_submit():
+    """Постановка задания на обход магазина или пакетное получение товаров"""
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get('type')
+    
+    if kind == 'shop':
+        if not payload.get('url'):
+            return jsonify({'error': 'Не указан параметр url'}), 400
+        params = {k: payload.get(k) for k in ('url', 'limit', 'max_pages', 'with_details', 'concurrency', 'resume')}
+    elif kind == 'shop_incremental':
+        if not payload.get('url'):
+            return jsonify({'error': 'Не указан параметр url'}), 400
+        params = {k: payload.get(k) for k in ('url', 'max_pages', 'concurrency')}
+    elif kind == 'products':
+        if not payload.get('urls') or not isinstance(payload['urls'], list):
+            return jsonify({'error': 'Не указан список urls'}), 400
+        if payload.get('mode') and payload['mode'] not in FETCH_MODES:
+            return jsonify({'error': 'Параметр mode должен быть auto, http или selenium'}), 400
+        params = {k: payload.get(k) for k in ('urls', 'concurrency', 'mode')}
+    else:
+        return jsonify({'error': 'Параметр type должен быть shop, shop_incremental или products'}), 400
+    
+    try:
+        job_id = job_manager.submit(kind, params)
+    except QueueFullError:
+        response = jsonify({'error': 'Очередь заданий заполнена, повторите позже'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+        'results_url': f'/api/jobs/{job_id}/results',
+    }), 202
+
+
+@app.route('/api/checkpoints/<shop_id>', methods=['GET', 'DELETE'])
+def api_checkpoint(shop_id):
+    """Контрольные точки обходов магазина; DELETE - следующие обходы начнутся заново"""
+    checkpoints = [checkpoint_store.summary(key) for key in checkpoint_store.shop_keys(shop_id)]
+    checkpoints = [checkpoint for checkpoint in checkpoints if checkpoint]
+    if not checkpoints:
+        return jsonify({'error': 'Контрольная точка не найдена'}), 404
+    if request.method == 'DELETE':
+        for checkpoint in checkpoints:
+            checkpoint_store.delete(checkpoint['key'])
+        return jsonify({'shop_id': shop_id, 'deleted': len(checkpoints)})
+    return jsonify({'shop_id': shop_id, 'checkpoints': checkpoints})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Статус и прогресс задания"""
+    job = job_manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def api_job_results(job_id):
+    """Постраничная выдача результатов задания"""
+    job = job_manager.store.get(job_id)
+    if not job:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    
+    offset = max(0, _int_arg('offset') or 0)
+    limit = min(max(1, _int_arg('limit') or JOB_RESULTS_PAGE_SIZE), 1000)
+    results = job_manager.store.results(job_id, offset=offset, limit=limit)
+    next_offset = offset + len(results)
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'offset': offset,
+        'count': len(results),
+        'results': results,
+        'next_offset': next_offset if next_offset < job['results_count'] else None,
+    })
+
+
+def _export_row(result):
+    """Результат пакета или задания в виде плоского товара для выгрузки"""
+    if 'product' not in result:
+        return result
+    return dict(result['product'] or {'url': result['url']}, error=result.get('error'))
+
+
+def _iter_job_results(job_id):
+    """Все результаты задания порциями из хранилища"""
+    offset = 0
+    while True:
+        results = job_manager.store.results(job_id, offset=offset, limit=1000)
+        if not results:
+            return
+        for result in results:
+            yield _export_row(result)
+        offset += len(results)
+
+
+def _export_response(rows, name):
+    """Потоковый ответ с файлом выгрузки (формат, сжатие и prefetch_images из параметров запроса)"""
+    fmt = request.args.get('format', 'csv')
+    compression = request.args.get('compression') or None
+    try:
+        check_export_options(fmt, compression)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('prefetch_images') == '1':
+        if image_cache is None:
+            return jsonify({'error': 'Кэш изображений выключен (IMAGE_CACHE_ENABLED=1)'}), 400
+        rows = image_cache.iter_prefetch(rows, concurrency=IMAGE_PREFETCH_CONCURRENCY)
+    
+    filename = export_filename(name, fmt, compression)
+    return Response(
+        stream_with_context(iter_export(rows, fmt, compression, chunk_size=EXPORT_CHUNK_SIZE)),
+        content_type=export_content_type(fmt, compression),
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@app.route('/api/jobs/<job_id>/export', methods=['GET'])
+def api_job_export(job_id):
+    """Выгрузка результатов задания в CSV, JSONL или Parquet (format, compression)"""
+    if not job_manager.store.get(job_id):
+        return jsonify({'error': 'Задание не найдено'}), 404
+    return _export_response(_iter_job_results(job_id), f'job-{job_id}')
+
+
+@app.route('/api/shop/export', methods=['GET'])
+def api_shop_export():
+    """Выгрузка товаров магазина по мере обхода (format, compression, with_details)
+    
+    Файл отдается частями, пока идет обход; для больших магазинов надежнее
+    задание type=shop и выгрузка его результатов.
+    """
+    shop_url = request.args.get('url')
+    if not shop_url:
+        return jsonify({'error': 'Не указан параметр url'}), 400
+    
+    parser = make_parser()
+    listings = parser.iter_shop_listings(shop_url, limit=_int_arg('limit'), max_pages=_int_arg('max_pages'))
+    if request.args.get('with_details') == '1':
+        links = (listing['url'] for listing in listings)
+        rows = (
+            _export_row(_result_to_dict(result))
+            for result in parser.iter_products_details(links, concurrency=_int_arg('concurrency'))
+        )
+    else:
+        rows = listings
+    
+    shop_id = shop_url.split('/')[-1].split('?')[0]
+    return _export_response(rows, f'shop-{shop_id}')
+
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """Статистика пула WebDriver, ожиданий загрузки страниц и кэша товаров"""
+    return jsonify({
+        'driver_pool': driver_pool.stats(),
+        'page_waits': wait_stats.snapshot(),
+        'lean_browsing': lean_stats.snapshot() if LEAN_BROWSING else None,
+        'product_cache': product_cache.stats() if product_cache else None,
+        'job_queue': {'depth': job_manager.queue_depth(), 'max_size': JOB_QUEUE_SIZE},
+        'html_selectors': product_selectors.stats(),
+        'rate_limits': rate_limiter.stats() if rate_limiter else None,
+        'image_cache': image_cache.stats() if image_cache else None,
+        'browser_tabs': tab_scheduler.stats() if tab_scheduler else None,
+        'checkpoints': checkpoint_store.stats(),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def api_metrics():
+    """Метрики стадий парсера в формате Prometheus (суммарно по всем воркерам gunicorn)"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+if __name__ == '__main__':
+    job_manager.recover()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from throttling import (
+    CAPTCHA_MARKERS, OK, PERMANENT, THROTTLED, TRANSIENT, RetriesExhausted, RetryPolicy,
+    classify_response, retry_after_seconds
+)
+
+logger = logging.getLogger(__name__)
+
+
+def transient_errors():
+    """Сетевые ошибки aiohttp, после которых запрос стоит повторить
+
+    aiohttp загружается при первом асинхронном запросе, а не при импорте модуля.
+    """
+    import aiohttp
+    return aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError
+
+
+class EventLoopThread:
+    """Общий для процесса цикл asyncio в фоновом потоке
+
+    Синхронный код отдает в него корутины через run и iterate. Цикл
+    создается при первом обращении и заново после fork. Блокирующие вызовы
+    (SQLite, разбор HTML, Selenium) идут в собственный пул threads потоков.
+    """
+
+    def __init__(self, threads=32):
+        self.threads = threads
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def loop(self):
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    loop.set_default_executor(
+                        ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='uzum-async-io')
+                    )
+                    thread = threading.Thread(target=loop.run_forever, name='uzum-async', daemon=True)
+                    thread.start()
+                    self._loop = loop
+                    self._pid = os.getpid()
+        return self._loop
+
+    @property
+    def started(self):
+        return self._loop is not None and self._pid == os.getpid()
+
+    def run(self, coro, timeout=None):
+        """Выполнение корутины в общем цикле с ожиданием результата"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result(timeout)
+
+    def iterate(self, agen):
+        """Синхронный генератор поверх асинхронного"""
+        try:
+            while True:
+                try:
+                    item = self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            self.run(agen.aclose())
+
+
+class FetchedResponse:
+    """Прочитанный ответ aiohttp с интерфейсом ответа requests (status_code, headers, text)"""
+
+    def __init__(self, status_code, headers, content, charset=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        # Без явной кодировки страницы uzum.uz в UTF-8
+        self.encoding = charset or 'utf-8'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncHttp:
+    """Асинхронный HTTP GET с общим лимитом частоты и повторами, как у ThrottledHttp
+
+    Сессия aiohttp создается в цикле при первом запросе; число одновременных
+    соединений ограничено connections.
+    """
+
+    def __init__(self, headers=None, limiter=None, policy=None, connections=200, timeout=10,
+                 acquire_timeout=60.0, captcha_markers=CAPTCHA_MARKERS, on_event=None):
+        self.headers = headers or {}
+        self.limiter = limiter
+        self.policy = policy or RetryPolicy()
+        self.connections = connections
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.captcha_markers = captcha_markers
+        self._on_event = on_event or (lambda event: None)
+        self._session = None
+        self._session_loop = None
+
+    def session(self):
+        # Сессия привязана к циклу; после fork цикл новый, и сессия создается заново
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            import aiohttp
+            self._session_loop = loop
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def acquire(self, host):
+        """Ожидание токена без блокировки цикла (состояние лимита в SQLite читается в потоке)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+        while True:
+            wait = await asyncio.to_thread(self.limiter.try_acquire, host)
+            if not wait:
+                return True
+            if loop.time() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def get(self, url, headers=None, params=None):
+        host = urlparse(url).hostname or ''
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None and not await self.acquire(host):
+                raise RetriesExhausted(f"Не дождались лимита запросов к {host}", THROTTLED)
+
+            response = None
+            try:
+                async with self.session().get(url, headers=headers, params=params) as raw:
+                    content = await raw.read()
+                    response = FetchedResponse(raw.status, raw.headers, content, raw.charset)
+                outcome = classify_response(response, self.captcha_markers)
+                error = 'Капча' if response.status_code == 200 else f"HTTP {response.status_code}"
+            except transient_errors() as e:
+                outcome = TRANSIENT
+                error = str(e) or type(e).__name__
+
+            if self.limiter is not None:
+                await asyncio.to_thread(self.limiter.report, host, outcome, retry_after_seconds(response))
+            if outcome in (OK, PERMANENT):
+                return response
+
+            if attempt > self.policy.retries:
+                self._on_event('exhausted')
+                raise RetriesExhausted(f"{error} после {attempt} попыток: {url}", outcome)
+
+            delay = self.policy.delay(attempt, retry_after_seconds(response))
+            logger.warning(f"{error} при запросе {url}, повтор {attempt} через {delay:.1f} с")
+            self._on_event('retry')
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,109 @@
+"""Микробенчмарк разбора HTML товара: прежний обход селекторов против SelectorEngine
+
+Запуск из корня проекта:
+    python benchmarks/bench_parse_html.py [-n 200] [fixture.html ...]
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from html_extract import HTML_PARSER, PRODUCT_FIELDS, SelectorEngine, parse_document  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_extract(html):
+    """Прежний способ: html.parser и отдельный select для каждого селектора"""
+    soup = BeautifulSoup(html, 'html.parser')
+    result = {}
+    for field, (kind, selectors) in PRODUCT_FIELDS.items():
+        result[field] = None
+        for selector in selectors:
+            if kind == 'text':
+                element = soup.select_one(selector)
+                if element and element.text.strip():
+                    result[field] = element.text.strip()
+                    break
+            else:
+                elements = soup.select(selector)
+                if elements:
+                    result[field] = elements
+                    break
+    return result
+
+
+def engine_extract(engine, html):
+    """SelectorEngine на самом быстром доступном парсере"""
+    return engine.extract(parse_document(html))
+
+
+def engine_extract_soup(engine, html):
+    """SelectorEngine без lxml: html.parser и один проход по дереву"""
+    return engine.extract(BeautifulSoup(html, 'html.parser'))
+
+
+def measure(func, html, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'p50': timings[len(timings) // 2],
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'total': sum(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    parser.add_argument('fixtures', nargs='*')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    fixtures = args.fixtures or sorted(glob.glob(os.path.join(FIXTURES_DIR, 'product*.html')))
+    engine = SelectorEngine(PRODUCT_FIELDS)
+
+    print(f"Итераций: {args.iterations}")
+    for path in fixtures:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        # Результаты всех способов должны совпадать
+        legacy = legacy_extract(html)
+        for variant in (engine_extract, engine_extract_soup):
+            current = variant(engine, html)
+            for field, (kind, _) in PRODUCT_FIELDS.items():
+                if kind == 'text':
+                    assert legacy[field] == current[field], field
+                else:
+                    assert len(legacy[field] or []) == len(current[field] or []), field
+
+        before = measure(legacy_extract, html, args.iterations)
+        print(f"{os.path.basename(path)} ({len(html) // 1024} КБ)")
+        print(f"  прежний обход селекторов: p50 {before['p50'] * 1000:.2f} мс, p95 {before['p95'] * 1000:.2f} мс")
+        # Сам разбор документа, без селекторов: остальное время уходит на обход дерева
+        parse_only = measure(parse_document, html, args.iterations)
+        print(f"  разбор {HTML_PARSER} без селекторов: p50 {parse_only['p50'] * 1000:.2f} мс")
+        for title, variant in (
+            (f'SelectorEngine ({HTML_PARSER})', engine_extract),
+            ('SelectorEngine (html.parser)', engine_extract_soup),
+        ):
+            after = measure(lambda h: variant(engine, h), html, args.iterations)
+            print(
+                f"  {title}: p50 {after['p50'] * 1000:.2f} мс, p95 {after['p95'] * 1000:.2f} мс, "
+                f"ускорение x{before['total'] / after['total']:.2f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Память на каталог: прежние словари товаров против записей Product
+
+Запуск из корня проекта:
+    python benchmarks/bench_product_memory.py [-n 100000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product import Product  # noqa: E402
+
+
+def make_product(i):
+    """Товар как после разбора страницы: уникальные строки, несколько изображений и цветов"""
+    return Product(
+        url=f'https://uzum.uz/ru/product/elektricheskij-chajnik-{i}',
+        name=f'Электрический чайник Tefal KI 270 1,7 л, вариант {i}',
+        description=f'Электрический чайник с корпусом из нержавеющей стали, объем 1,7 л, артикул {i}',
+        price_raw=389000 + i,
+        images=[f'https://images.uzum.uz/c{i}/{n}/t_product_540_high.jpg' for n in range(4)],
+        colors=[(f'Черный {i}', str(i)), (f'Белый {i}', str(i + 1))],
+        source='http',
+    )
+
+
+def measure(build, count):
+    """Прирост памяти (байт на товар) и время построения каталога"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    catalogue = [build(i) for i in range(count)]
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalogue
+    return size / count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    # Прежний формат: словарь со всеми производными строками, как его собирал _process_js_data
+    dict_bytes, dict_time = measure(lambda i: make_product(i).to_dict(), args.count)
+    record_bytes, record_time = measure(make_product, args.count)
+
+    print(f"{'формат':<10} {'байт/товар':>12} {'каталог, МБ':>12} {'построение, с':>14}")
+    for name, per_item, elapsed in (('dict', dict_bytes, dict_time), ('Product', record_bytes, record_time)):
+        print(f"{name:<10} {per_item:>12.0f} {per_item * args.count / 2 ** 20:>12.1f} {elapsed:>14.2f}")
+    print(f"Экономия: {(1 - record_bytes / dict_bytes) * 100:.0f}% памяти")
+
+    # Сериализация в JSON-совместимый словарь для API и выгрузок
+    products = [make_product(i) for i in range(min(args.count, 10000))]
+    started = time.perf_counter()
+    for product in products:
+        product.to_dict()
+    per_item = (time.perf_counter() - started) / len(products)
+    print(f"Product.to_dict: {per_item * 1e6:.2f} мкс на товар")
+
+
+if __name__ == '__main__':
+    main()
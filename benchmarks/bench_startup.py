@@ -0,0 +1,191 @@
+"""Запуск воркеров: время импорта приложения, старт gunicorn и память на воркер
+
+Импорт замеряется в отдельных интерпретаторах: только приложение (зависимости
+загружаются при первом использовании) и приложение со всеми тяжелыми
+зависимостями (как при импорте всего сразу). Затем gunicorn запускается без
+preload и с preload: время до первого ответа, первый запрос товара (по HTTP с
+локальной замены сайта) и память каждого воркера - RSS и собственная (USS),
+которую воркер не делит с мастером.
+
+Запуск из корня проекта:
+    python benchmarks/bench_startup.py [-n 5] [-w 4]
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_site import StandInSite  # noqa: E402
+
+HEAVY_MODULES = ('selenium', 'bs4', 'lxml', 'prometheus_client', 'requests', 'aiohttp', 'pyarrow')
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+if {preload} and hasattr(app, 'preload_backends'):
+    app.preload_backends()
+elapsed = time.perf_counter() - started
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+loaded = [name for name in {modules!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'rss_kb': rss, 'loaded': loaded}}))
+'''
+
+
+def bench_env():
+    """Окружение без браузера, лимитов и рабочих данных"""
+    env = dict(os.environ)
+    env.update({
+        'UZUM_DATA_DIR': tempfile.mkdtemp(prefix='uzum-bench-'),
+        'PROMETHEUS_MULTIPROC_DIR': tempfile.mkdtemp(prefix='uzum-bench-metrics-'),
+        'CACHE_ENABLED': '0',
+        'RATE_LIMIT': '0',
+        'DRIVER_POOL_WARMUP': '0',
+        'PYTHONPATH': ROOT,
+    })
+    return env
+
+
+def measure_import(preload, runs):
+    """Медиана времени импорта и RSS процесса после него"""
+    script = IMPORT_SCRIPT.format(preload=preload, modules=HEAVY_MODULES)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=ROOT, env=bench_env(),
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': statistics.median(r['seconds'] for r in results),
+        'rss_mb': statistics.median(r['rss_kb'] for r in results) / 1024,
+        'loaded': results[-1]['loaded'],
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def children(pid):
+    """Воркеры gunicorn - дочерние процессы мастера"""
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def memory_kb(pid):
+    """RSS и USS (Private_Clean + Private_Dirty) процесса"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values.get('Rss', 0), values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+
+def bench_gunicorn(preload, workers, product_url):
+    """Старт gunicorn: время до первого ответа, первый запрос товара и память воркеров"""
+    port = free_port()
+    env = bench_env()
+    env.update({
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_PRELOAD': '1' if preload else '0',
+    })
+    base_url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + 60
+        while True:
+            try:
+                get(f'{base_url}/api/stats', timeout=5)
+                break
+            except OSError:
+                if process.poll() is not None or time.perf_counter() > deadline:
+                    raise RuntimeError("gunicorn не запустился")
+                time.sleep(0.02)
+        first_response = time.perf_counter() - started
+
+        # Все воркеры должны успеть загрузиться, прежде чем мерить память
+        while len(children(process.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        time.sleep(1)
+
+        query = urllib.parse.urlencode({'url': product_url, 'mode': 'http'})
+        request_started = time.perf_counter()
+        get(f'{base_url}/api/product?{query}')
+        first_product = time.perf_counter() - request_started
+
+        memory = [memory_kb(pid) for pid in children(process.pid)]
+        return {
+            'first_response': first_response,
+            'first_product': first_product,
+            'workers': len(memory),
+            'rss_mb': statistics.mean(rss for rss, _ in memory) / 1024,
+            'uss_mb': statistics.mean(uss for _, uss in memory) / 1024,
+            'master_rss_mb': memory_kb(process.pid)[0] / 1024,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'импорт':<22} {'время, с':>9} {'RSS, МБ':>9}  загружено")
+    for name, preload in (('app', False), ('app + зависимости', True)):
+        result = measure_import(preload, args.runs)
+        print(
+            f"{name:<22} {result['seconds']:>9.3f} {result['rss_mb']:>9.1f}  "
+            f"{', '.join(result['loaded']) or '-'}"
+        )
+
+    print()
+    print(
+        f"{'gunicorn, ' + str(args.workers) + ' воркера':<22} {'ответ, с':>9} {'товар, с':>9} "
+        f"{'RSS, МБ':>9} {'USS, МБ':>9} {'мастер, МБ':>11}"
+    )
+    with StandInSite() as site:
+        product_url = site.product_url('state', 1001)
+        for name, preload in (('без preload', False), ('preload', True)):
+            results = [bench_gunicorn(preload, args.workers, product_url) for _ in range(max(1, args.runs // 2))]
+            median = {key: statistics.median(r[key] for r in results) for key in results[0]}
+            print(
+                f"{name:<22} {median['first_response']:>9.2f} {median['first_product']:>9.3f} "
+                f"{median['rss_mb']:>9.1f} {median['uss_mb']:>9.1f} {median['master_rss_mb']:>11.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""Офлайн-бенчмарк парсера на записанных страницах uzum.uz
+
+Поднимает локальную замену сайта (standin_site), прогоняет парсер целиком и
+по стадиям и выводит p50/p95, страниц в секунду и пиковый RSS. Сеть не нужна.
+Стадии браузера выполняются, только если удалось запустить Chrome.
+
+Запуск из корня проекта:
+    python benchmarks/run_benchmarks.py [-n 20] [--no-browser] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Бенчмарк не должен задевать рабочие данные и кэш
+os.environ.setdefault('UZUM_DATA_DIR', tempfile.mkdtemp(prefix='uzum-bench-'))
+os.environ['CACHE_ENABLED'] = '0'
+# Локальная замена сайта не ограничивает запросы, лимит частоты исказил бы замеры
+os.environ['RATE_LIMIT'] = '0'
+
+from standin_site import FIXTURES_DIR, StandInSite  # noqa: E402
+
+
+class Stage:
+    """Замеры одной стадии (pages - страниц за один запуск, для пакетов)"""
+
+    def __init__(self, name, pages=1):
+        self.name = name
+        self.pages = pages
+        self.timings = []
+
+    def measure(self, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.timings.append(time.perf_counter() - started)
+        return result
+
+    def summary(self):
+        timings = sorted(self.timings)
+        if not timings:
+            return None
+        total = sum(timings)
+        return {
+            'stage': self.name,
+            'runs': len(timings),
+            'p50_ms': timings[len(timings) // 2] * 1000,
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            'pages_per_sec': len(timings) * self.pages / total if total else 0.0,
+        }
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса и дочерних процессов (Chrome), МБ"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': own / scale, 'children': children / scale}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def bench_offline_stages(app, iterations):
+    """Стадии без сети и браузера: разбор встроенного состояния и HTML"""
+    parser = app.UzumParser()
+    stages = []
+
+    for kind, fixture in (('state', 'product_state.html'), ('nuxt', 'product_nuxt.html')):
+        html = read_fixture(fixture)
+        stage = Stage(f'js_state_extract[{kind}]')
+        for _ in range(iterations):
+            data = stage.measure(parser._extract_data_from_html, html)
+            assert data, fixture
+        stages.append(stage)
+
+        stage = Stage(f'process_js_data[{kind}]')
+        for _ in range(iterations):
+            stage.measure(parser._process_js_data, data)
+        stages.append(stage)
+
+    html = read_fixture('product_page.html')
+    stage = Stage('html_parse')
+    for _ in range(iterations):
+        stage.measure(parser._parse_html_source, html, 'bench')
+    stages.append(stage)
+    return stages
+
+
+def bench_http(app, site, iterations):
+    """Быстрый путь без браузера: HTTP-запрос и разбор страницы товара"""
+    parser = app.UzumParser(fetch_mode='http')
+    stages = []
+    for kind in ('state', 'nuxt'):
+        stage = Stage(f'http_product[{kind}]')
+        for i in range(iterations):
+            product = stage.measure(parser.get_product_details, site.product_url(kind, 1000 + i))
+            assert product and product.source == 'http', kind
+        stages.append(stage)
+
+    urls = [site.product_url(('state', 'nuxt')[i % 2], 2000 + i) for i in range(iterations * 4)]
+    stage = Stage('http_batch[concurrency=8]')
+    stage.measure(parser.get_products_details, urls, 8)
+    batch = stage.summary()
+    batch['pages_per_sec'] = len(urls) / stage.timings[0]
+
+    # Тот же пакет в цикле asyncio: все товары одновременно в одном потоке
+    async_parser = app.AsyncUzumParser(fetch_mode='http')
+    stage = Stage(f'async_batch[concurrency={len(urls)}]')
+    results = stage.measure(async_parser.get_products_details, urls, len(urls))
+    assert all(item['product'] for item in results)
+    async_batch = stage.summary()
+    async_batch['pages_per_sec'] = len(urls) / stage.timings[0]
+
+    # Обход магазина через API каталога: 144 товара страницами по 48
+    app.listing_client.url_template = site.listing_api_url()
+    app.listing_client.page_size = 48
+    listing_parser = app.UzumParser(pagination='api')
+    stage = Stage('shop_listing_api[3 pages]', pages=3)
+    for _ in range(iterations):
+        links = stage.measure(listing_parser.get_shop_products, site.shop_url())
+        assert len(links) == 144, len(links)
+    stages.append(stage)
+    return stages, [batch, async_batch]
+
+
+def bench_browser(app, site, iterations):
+    """Стадии браузера: запуск, переход, ожидание, извлечение из JS, разбор HTML"""
+    launch = Stage('driver_launch')
+    driver = launch.measure(app.create_driver)
+    if driver is None:
+        return None
+
+    parser = app.UzumParser(fetch_mode='selenium', pagination='dom')
+    navigation = Stage('navigation')
+    wait = Stage('wait')
+    js_extract = Stage('js_extract')
+    html_parse = Stage('html_parse[driver]')
+    try:
+        for i in range(iterations):
+            navigation.measure(parser._open_page, driver, site.product_url('state', 3000 + i))
+            wait.measure(parser._wait_for_page, driver, 'product', app.PRODUCT_READY_JS)
+            js_extract.measure(parser._extract_data_from_js, driver)
+
+            driver.get(site.product_url('html', 3000 + i))
+            parser._wait_for_page(driver, 'product', app.PRODUCT_READY_JS)
+            html_parse.measure(parser._parse_html, driver, 'bench')
+    finally:
+        app.close_driver(driver)
+
+    stages = [launch, navigation, wait, js_extract, html_parse]
+
+    # Целиком через пул: страницы товаров и обход магазина с пагинацией
+    end_to_end = Stage('selenium_product[e2e]')
+    for i in range(iterations):
+        end_to_end.measure(parser.get_product_details, site.product_url('state', 4000 + i))
+    stages.append(end_to_end)
+
+    shop = Stage('shop_crawl[3 pages]', pages=3)
+    links = shop.measure(parser.get_shop_products, site.shop_url())
+    assert len(links) == 144, len(links)
+    stages.append(shop)
+
+    # Пакет товаров во вкладках одного браузера
+    if app.tab_scheduler is not None:
+        urls = [site.product_url('state', 5000 + i) for i in range(iterations * 2)]
+        tabs = Stage(f'selenium_batch[tabs={app.BROWSER_TABS}]', pages=len(urls))
+        results = tabs.measure(parser.get_products_details, urls, app.BROWSER_TABS)
+        assert all(item['product'] for item in results)
+        stages.append(tabs)
+        app.tab_scheduler.stop()
+
+    app.driver_pool.close()
+    return stages
+
+
+def print_table(rows):
+    print(f"{'стадия':<28} {'запусков':>8} {'p50, мс':>10} {'p95, мс':>10} {'стр/с':>10}")
+    for row in rows:
+        print(
+            f"{row['stage']:<28} {row['runs']:>8} {row['p50_ms']:>10.2f} "
+            f"{row['p95_ms']:>10.2f} {row['pages_per_sec']:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    parser.add_argument('--no-browser', action='store_true', help='не запускать стадии Chrome')
+    parser.add_argument('--json', help='записать результаты в JSON-файл')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    import app
+    # Зависимости загружаются при первом использовании; замеряется работа, а не импорт
+    app.preload_backends()
+
+    rows = [stage.summary() for stage in bench_offline_stages(app, args.iterations)]
+
+    with StandInSite() as site:
+        http_stages, batches = bench_http(app, site, args.iterations)
+        rows += [stage.summary() for stage in http_stages] + batches
+
+        if not args.no_browser:
+            browser_stages = bench_browser(app, site, args.iterations)
+            if browser_stages is None:
+                print("Chrome недоступен, стадии браузера пропущены")
+            else:
+                rows += [stage.summary() for stage in browser_stages]
+    app.close_async_engine()
+
+    rss = peak_rss_mb()
+    print_table(rows)
+    print(f"Пиковый RSS: процесс {rss['self']:.1f} МБ, дочерние процессы {rss['children']:.1f} МБ")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'stages': rows, 'peak_rss_mb': rss}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Локальная замена uzum.uz для бенчмарков: записанные страницы товаров и магазина"""
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Вид страницы товара определяется частью slug: tovar-state-1001, tovar-nuxt-1002, tovar-html-1003
+PRODUCT_FIXTURES = {
+    'state': 'product_state.html',
+    'nuxt': 'product_nuxt.html',
+    'html': 'product_page.html',
+}
+PRODUCT_RE = re.compile(r'^/ru/product/[\w-]*?(state|nuxt|html)-\d+$')
+SHOP_RE = re.compile(r'^/ru/shop/[\w-]+$')
+LISTING_API_RE = re.compile(r'^/api/v2/shop/[\w-]+/products$')
+# Карточка товара на записанной странице магазина
+CARD_RE = re.compile(
+    r'<a href="/ru/product/([\w-]+)".*?<img src="([^"]+)".*?product-card__title">([^<]*)<.*?<span>([\d ]+) сум',
+    re.DOTALL
+)
+
+
+def _load_fixtures():
+    pages = {}
+    for name in os.listdir(FIXTURES_DIR):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                pages[name] = f.read()
+    return pages
+
+
+def _load_listing(pages):
+    """Товары магазина в формате API каталога, собранные из записанных страниц"""
+    items = []
+    names = sorted((name for name in pages if name.startswith('shop_page_')), key=lambda n: int(n[10:-5]))
+    for name in names:
+        for slug, image, title, price in CARD_RE.findall(pages[name].decode('utf-8')):
+            items.append({
+                'productId': int(slug.rsplit('-', 1)[1]),
+                'slug': slug,
+                'title': title,
+                'sellPrice': int(price.replace(' ', '')),
+                'photos': [{'photo': {'url': image}}],
+                'available': True,
+            })
+    return items
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    pages = {}
+    listing = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = None
+
+        if LISTING_API_RE.match(url.path):
+            query = parse_qs(url.query)
+            page = int(query.get('page', ['0'])[0])
+            size = int(query.get('size', ['100'])[0])
+            self._send(json.dumps({'payload': {
+                'products': self.listing[page * size:(page + 1) * size],
+                'total': len(self.listing),
+            }}).encode('utf-8'), 'application/json')
+            return
+
+        match = PRODUCT_RE.match(url.path)
+        if match:
+            name = PRODUCT_FIXTURES[match.group(1)]
+        elif SHOP_RE.match(url.path):
+            page = parse_qs(url.query).get('page', ['1'])[0]
+            name = f'shop_page_{page}.html'
+
+        body = self.pages.get(name) if name else None
+        if body is None:
+            self.send_error(404)
+            return
+
+        self._send(body, 'text/html; charset=utf-8')
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    # Очередь подключений для сотен одновременных запросов движка asyncio
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StandInSite:
+    """HTTP-сервер с записанными страницами на свободном локальном порту"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        StandInHandler.pages = _load_fixtures()
+        StandInHandler.listing = _load_listing(StandInHandler.pages)
+        self._server = StandInServer((host, port), StandInHandler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def product_url(self, kind, product_id):
+        return f'{self.base_url}/ru/product/tovar-{kind}-{product_id}'
+
+    def shop_url(self, name='technohome'):
+        return f'{self.base_url}/ru/shop/{name}'
+
+    def listing_api_url(self):
+        return f'{self.base_url}/api/v2/shop/{{shop_id}}/products'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class CDPError(Exception):
+    """Ошибка команды DevTools или разрыв соединения с браузером"""
+
+
+class CDPConnection:
+    """Одно websocket-соединение с браузером, по которому идут команды всех вкладок"""
+
+    def __init__(self, ws_url):
+        self.ws_url = ws_url
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._ws = None
+        self._session = None
+        self._reader = None
+
+    @property
+    def closed(self):
+        return self._ws is None or self._ws.closed
+
+    async def connect(self):
+        import aiohttp
+        self._session = aiohttp.ClientSession()
+        self._ws = await self._session.ws_connect(self.ws_url, max_msg_size=0)
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        import aiohttp
+        try:
+            async for message in self._ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                future = self._pending.pop(data.get('id'), None)
+                if future is None or future.done():
+                    # События (Page.*, Network.*) не нужны: готовность страницы проверяется опросом
+                    continue
+                if 'error' in data:
+                    future.set_exception(CDPError(data['error'].get('message', 'Ошибка DevTools')))
+                else:
+                    future.set_result(data.get('result', {}))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("Соединение с браузером закрыто"))
+            self._pending.clear()
+
+    async def send(self, method, params=None, session_id=None, timeout=30):
+        if self.closed:
+            raise CDPError("Соединение с браузером закрыто")
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        try:
+            await self._ws.send_str(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+
+class CDPTab:
+    """Вкладка браузера с отдельной сессией DevTools"""
+
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=30):
+        return await self.connection.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    async def evaluate(self, script, timeout=30):
+        """Выполнение тела функции (как execute_script в Selenium), результат по значению"""
+        result = await self.send('Runtime.evaluate', {
+            'expression': f'(() => {{{script}}})()',
+            'returnByValue': True,
+            'awaitPromise': True,
+        }, timeout=timeout)
+        if result.get('exceptionDetails'):
+            raise CDPError(result['exceptionDetails'].get('text', 'Ошибка выполнения скрипта'))
+        return result.get('result', {}).get('value')
+
+    async def navigate(self, url, timeout=30):
+        result = await self.send('Page.navigate', {'url': url}, timeout=timeout)
+        if result.get('errorText'):
+            raise CDPError(f"Не удалось открыть {url}: {result['errorText']}")
+
+    async def wait_for(self, script, timeout, poll=0.2):
+        """Опрос скрипта до истинного значения; None, если не дождались"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                value = await self.evaluate(script, timeout=max(1.0, deadline - loop.time()))
+                if value:
+                    return value
+            except CDPError:
+                # Во время перехода контекст выполнения пересоздается
+                pass
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(poll)
+
+    async def content(self):
+        return await self.evaluate('return document.documentElement.outerHTML;')
+
+
+class AsyncBrowser:
+    """Headless Chrome под управлением DevTools: много вкладок на один процесс браузера
+
+    Если задан ws_url (например, внешний браузер), процесс не запускается.
+    """
+
+    def __init__(self, chrome_bin=None, ws_url=None, max_tabs=8, user_agent=None, blocked_patterns=(),
+                 launch_timeout=20):
+        self.chrome_bin = chrome_bin or shutil.which('chromium') or shutil.which('google-chrome') or 'chromium'
+        self.ws_url = ws_url
+        self.max_tabs = max_tabs
+        self.user_agent = user_agent
+        self.blocked_patterns = list(blocked_patterns)
+        self.launch_timeout = launch_timeout
+        self._connection = None
+        self._process = None
+        self._profile_dir = None
+        self._tabs = None
+        self._start_lock = None
+
+    async def _launch(self):
+        """Запуск Chrome со свободным портом отладки; адрес читается из DevToolsActivePort"""
+        self._profile_dir = tempfile.mkdtemp(prefix='uzum-chrome-')
+        self._process = await asyncio.create_subprocess_exec(
+            self.chrome_bin, '--headless=new', '--no-sandbox', '--disable-dev-shm-usage',
+            '--disable-extensions', '--disable-blink-features=AutomationControlled',
+            '--disable-background-timer-throttling', '--disable-renderer-backgrounding',
+            '--remote-debugging-port=0', f'--user-data-dir={self._profile_dir}', 'about:blank',
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        port_file = os.path.join(self._profile_dir, 'DevToolsActivePort')
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.launch_timeout
+        while loop.time() < deadline:
+            if os.path.exists(port_file):
+                with open(port_file) as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f'ws://127.0.0.1:{lines[0]}{lines[1]}'
+            if self._process.returncode is not None:
+                break
+            await asyncio.sleep(0.1)
+        raise CDPError("Chrome не запустился или не открыл порт отладки")
+
+    async def start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._connection is not None and not self._connection.closed:
+                return
+            await self._shutdown()
+            ws_url = self.ws_url or await self._launch()
+            self._connection = CDPConnection(ws_url)
+            await self._connection.connect()
+            self._tabs = asyncio.Semaphore(self.max_tabs)
+            logger.info(f"Браузер DevTools подключен, вкладок одновременно: {self.max_tabs}")
+
+    @asynccontextmanager
+    async def tab(self):
+        """Новая вкладка на время работы с одной страницей"""
+        await self.start()
+        connection = self._connection
+        async with self._tabs:
+            target = await connection.send('Target.createTarget', {'url': 'about:blank'})
+            target_id = target['targetId']
+            try:
+                attached = await connection.send('Target.attachToTarget', {'targetId': target_id, 'flatten': True})
+                tab = CDPTab(connection, target_id, attached['sessionId'])
+                # Runtime.evaluate и Page.navigate работают без включения доменов, а события
+                # включенных доменов только нагружают соединение: Network включается лишь
+                # для блокировки ресурсов, ее Chrome без домена не применяет
+                if self.blocked_patterns:
+                    await tab.send('Network.enable')
+                    await tab.send('Network.setBlockedURLs', {'urls': self.blocked_patterns})
+                if self.user_agent:
+                    await tab.send('Emulation.setUserAgentOverride', {'userAgent': self.user_agent})
+                yield tab
+            finally:
+                if not connection.closed:
+                    try:
+                        await connection.send('Target.closeTarget', {'targetId': target_id}, timeout=5)
+                    except (CDPError, asyncio.TimeoutError) as e:
+                        logger.warning(f"Не удалось закрыть вкладку: {e}")
+
+    async def _shutdown(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+            try:
+                await asyncio.wait_for(self._process.wait(), 10)
+            except asyncio.TimeoutError:
+                self._process.kill()
+        self._process = None
+        if self._profile_dir:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+    async def close(self):
+        await self._shutdown()
@@ -0,0 +1,260 @@
+import json
+import logging
+import time
+from itertools import islice
+
+from crawl_state import ShopCrawlState
+from product import Product
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore(SQLiteStore):
+    """Контрольные точки обхода магазинов: страница, найденные карточки и готовые товары
+
+    Запись об обходе живет, пока он не завершен целиком; по ней следующий
+    обход того же магазина с теми же параметрами (см. checkpoint_key)
+    продолжает работу, а не начинает с первой страницы.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+            key TEXT PRIMARY KEY,
+            shop_id TEXT NOT NULL,
+            shop_url TEXT NOT NULL,
+            page INTEGER NOT NULL DEFAULT 1,
+            source TEXT,
+            listed INTEGER NOT NULL DEFAULT 0,
+            started_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS crawl_checkpoints_shop_id ON crawl_checkpoints (shop_id);
+        CREATE TABLE IF NOT EXISTS crawl_links (
+            key TEXT NOT NULL,
+            url TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            listing TEXT NOT NULL,
+            PRIMARY KEY (key, url)
+        );
+        CREATE TABLE IF NOT EXISTS crawl_products (
+            key TEXT NOT NULL,
+            url TEXT NOT NULL,
+            product TEXT NOT NULL,
+            completed_at REAL NOT NULL,
+            PRIMARY KEY (key, url)
+        );
+    '''
+
+    def __init__(self, path, max_age=86400):
+        super().__init__(path)
+        # Более старые контрольные точки не продолжаются: данные магазина успели устареть
+        self.max_age = max_age
+
+    def load(self, key):
+        """Контрольная точка обхода или None, если ее нет или она устарела"""
+        row = self.execute('SELECT * FROM crawl_checkpoints WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if self.max_age and time.time() - row['updated_at'] > self.max_age:
+            logger.info(f"Контрольная точка {key} устарела, обход начнется заново")
+            self.delete(key)
+            return None
+        return dict(row)
+
+    def start(self, key, shop_id, shop_url):
+        """Новый обход: прежняя контрольная точка с тем же ключом удаляется"""
+        now = time.time()
+        with self.transaction() as conn:
+            self._delete(conn, key)
+            conn.execute(
+                'INSERT INTO crawl_checkpoints (key, shop_id, shop_url, started_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (key, shop_id, shop_url, now, now)
+            )
+
+    def links(self, key):
+        """Найденные карточки в порядке обнаружения"""
+        rows = self.execute(
+            'SELECT listing FROM crawl_links WHERE key = ? ORDER BY position', (key,)
+        ).fetchall()
+        return [json.loads(row['listing']) for row in rows]
+
+    def completed(self, key):
+        """Полученные товары: {url: словарь товара}"""
+        rows = self.execute('SELECT url, product FROM crawl_products WHERE key = ?', (key,)).fetchall()
+        return {row['url']: json.loads(row['product']) for row in rows}
+
+    def save_links(self, key, listings, page, source, listed=False):
+        """Порция карточек и текущая страница одной транзакцией"""
+        now = time.time()
+        with self.transaction() as conn:
+            position = conn.execute(
+                'SELECT COALESCE(MAX(position), -1) + 1 FROM crawl_links WHERE key = ?', (key,)
+            ).fetchone()[0]
+            conn.executemany(
+                'INSERT OR IGNORE INTO crawl_links (key, url, position, listing) VALUES (?, ?, ?, ?)',
+                [
+                    (key, listing['url'], position + i, json.dumps(listing, ensure_ascii=False))
+                    for i, listing in enumerate(listings)
+                ]
+            )
+            conn.execute(
+                'UPDATE crawl_checkpoints SET page = ?, source = ?, listed = ?, updated_at = ? WHERE key = ?',
+                (page, source, int(listed), now, key)
+            )
+
+    def save_products(self, key, products):
+        """Порция полученных товаров: [(url, словарь товара)]"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO crawl_products (key, url, product, completed_at) VALUES (?, ?, ?, ?)',
+                [(key, url, json.dumps(product, ensure_ascii=False), now) for url, product in products]
+            )
+            conn.execute('UPDATE crawl_checkpoints SET updated_at = ? WHERE key = ?', (now, key))
+
+    def _delete(self, conn, key):
+        for table in ('crawl_checkpoints', 'crawl_links', 'crawl_products'):
+            conn.execute(f'DELETE FROM {table} WHERE key = ?', (key,))
+
+    def delete(self, key):
+        with self.transaction() as conn:
+            self._delete(conn, key)
+
+    def shop_keys(self, shop_id):
+        """Ключи контрольных точек магазина (по одной на набор параметров обхода)"""
+        rows = self.execute('SELECT key FROM crawl_checkpoints WHERE shop_id = ? ORDER BY started_at', (shop_id,))
+        return [row['key'] for row in rows]
+
+    def summary(self, key):
+        """Состояние контрольной точки для API"""
+        checkpoint = self.load(key)
+        if checkpoint is None:
+            return None
+        checkpoint['listed'] = bool(checkpoint['listed'])
+        checkpoint['links'] = self.execute(
+            'SELECT COUNT(*) FROM crawl_links WHERE key = ?', (key,)
+        ).fetchone()[0]
+        checkpoint['products'] = self.execute(
+            'SELECT COUNT(*) FROM crawl_products WHERE key = ?', (key,)
+        ).fetchone()[0]
+        return checkpoint
+
+    def stats(self):
+        return {'active': self.execute('SELECT COUNT(*) FROM crawl_checkpoints').fetchone()[0]}
+
+
+def checkpoint_key(shop_id, limit=None, max_pages=None, with_details=False):
+    """Ключ контрольной точки: обходы с разными параметрами не продолжают и не затирают друг друга"""
+    return f"{shop_id}:limit={limit or 0}:pages={max_pages or 0}:details={int(bool(with_details))}"
+
+
+class ResumableCrawler:
+    """Обход магазина с контрольными точками
+
+    Карточки и товары записываются порциями по flush_every. Обход, прерванный
+    перезапуском воркера или падением браузера, при следующем запуске для того
+    же магазина с теми же limit, max_pages и with_details продолжается со
+    страницы контрольной точки, а уже полученные товары выдаются из хранилища
+    без повторной загрузки.
+    """
+
+    def __init__(self, parser, store, flush_every=20):
+        self.parser = parser
+        self.store = store
+        self.flush_every = max(1, flush_every)
+
+    def crawl(self, shop_url, limit=None, max_pages=None, with_details=False, concurrency=None, resume=True):
+        """Результаты обхода: {'url': ...} по карточкам или результаты пакета товаров при with_details"""
+        shop_id = shop_url.split('/')[-1].split('?')[0]
+        key = checkpoint_key(shop_id, limit, max_pages, with_details)
+        checkpoint = self.store.load(key) if resume else None
+        if checkpoint is None:
+            self.store.start(key, shop_id, shop_url)
+            restored = []
+        else:
+            restored = self.store.links(key)
+            if limit:
+                restored = restored[:limit]
+            logger.info(
+                f"Продолжение обхода магазина {shop_id}: страница {checkpoint['page']}, "
+                f"найдено {len(restored)} ссылок"
+            )
+
+        state = ShopCrawlState(
+            shop_id,
+            start_page=checkpoint['page'] if checkpoint else 1,
+            seen_links=(listing['url'] for listing in restored),
+            source=checkpoint['source'] if checkpoint else None
+        )
+        listed = bool(checkpoint and checkpoint['listed']) or bool(limit and len(restored) >= limit)
+        listings = self._iter_listings(shop_url, key, restored, listed, limit, max_pages, state)
+
+        if not with_details:
+            for listing in listings:
+                yield {'url': listing['url']}
+            self._finish(key, state, failed=0)
+            return
+
+        completed = self.store.completed(key) if checkpoint else {}
+        if limit:
+            # Готовые товары тоже входят в limit
+            completed = dict(islice(completed.items(), limit))
+        if completed:
+            logger.info(f"Из контрольной точки магазина {shop_id} взято {len(completed)} готовых товаров")
+        for index, (url, product) in enumerate(completed.items()):
+            yield {'index': index, 'url': url, 'product': Product.from_dict(product), 'error': None}
+
+        links = (listing['url'] for listing in listings if listing['url'] not in completed)
+        if limit:
+            links = islice(links, limit - len(completed))
+        buffer = []
+        failed = 0
+        try:
+            for result in self.parser.iter_products_details(links, concurrency=concurrency):
+                if result['product']:
+                    buffer.append((result['url'], result['product'].to_dict()))
+                    if len(buffer) >= self.flush_every:
+                        self.store.save_products(key, buffer)
+                        buffer = []
+                else:
+                    failed += 1
+                yield dict(result, index=result['index'] + len(completed))
+        finally:
+            if buffer:
+                self.store.save_products(key, buffer)
+            # Карточки после limit не нужны: последняя порция записывается до _finish
+            listings.close()
+        self._finish(key, state, failed)
+
+    def _iter_listings(self, shop_url, key, restored, listed, limit, max_pages, state):
+        """Карточки из контрольной точки, затем новые с записью в хранилище"""
+        yield from restored
+        if listed:
+            return
+
+        buffer = []
+        page = state.page
+        finished = False
+        try:
+            for listing in self.parser.iter_shop_listings(shop_url, limit=limit, max_pages=max_pages, state=state):
+                if buffer and (len(buffer) >= self.flush_every or state.page != page):
+                    self.store.save_links(key, buffer, page, state.source)
+                    buffer = []
+                page = state.page
+                buffer.append(listing)
+                yield listing
+            finished = not state.failed
+        finally:
+            # Записывается страница последней карточки: при продолжении она будет
+            # прочитана снова, повторы отсекаются по ссылкам
+            self.store.save_links(key, buffer, page, state.source, listed=finished)
+
+    def _finish(self, key, state, failed):
+        """Полностью завершенный обход больше не нужен; при ошибках точка сохраняется для повтора"""
+        if state.failed:
+            logger.warning(f"Обход {key} прерван, продолжение с контрольной точки")
+        elif failed:
+            logger.warning(f"Не получено {failed} товаров обхода {key}, они будут повторены при следующем обходе")
+        else:
+            self.store.delete(key)
@@ -0,0 +1,31 @@
+class ShopCrawlState:
+    """Ход обхода магазина: текущая страница и итог
+    
+    При продолжении обхода с контрольной точки start_page - страница, с которой
+    начинать, seen_links - уже найденные ссылки (они повторно не выдаются).
+    source - способ пагинации (api или dom), к которому относится номер
+    страницы: у API и сайта разный размер страниц.
+    """
+    
+    def __init__(self, shop_id, start_page=1, seen_links=None, source=None):
+        self.shop_id = shop_id
+        self.start_page = max(1, start_page)
+        self.seen_links = set(seen_links or ())
+        self.source = source
+        self.page = self.start_page
+        self.count = 0
+        # truncated: обход остановлен по limit/max_pages, failed: прерван ошибкой
+        self.truncated = False
+        self.failed = False
+    
+    def resume_page(self, source):
+        """Страница, с которой начинать обход способом source; дальше номера страниц относятся к нему"""
+        start_page = self.start_page if self.source in (None, source) else 1
+        self.source = source
+        self.page = start_page
+        return start_page
+    
+    @property
+    def complete(self):
+        """Магазин обойден целиком"""
+        return not self.truncated and not self.failed
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """Ограниченный пул долгоживущих экземпляров Selenium WebDriver"""
+
+    def __init__(self, factory, closer=None, max_size=2, max_pages=50, acquire_timeout=120, on_event=None):
+        # factory() создает новый драйвер (или возвращает None при ошибке),
+        # closer(driver) корректно его закрывает, on_event(name) получает события пула
+        self._factory = factory
+        self._closer = closer or (lambda driver: driver.quit())
+        self._on_event = on_event or (lambda event: None)
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._pages = {}
+        # Все запущенные драйверы, включая выданные: при закрытии пула закрываются и они
+        self._drivers = {}
+        self._total = 0
+        self._closed = False
+
+        # Счетчики использования пула
+        self.hits = 0
+        self.misses = 0
+        self.launches = 0
+        self.recycled = 0
+
+    def _launch(self):
+        """Запуск нового драйвера через фабрику"""
+        started = time.monotonic()
+        try:
+            driver = self._factory()
+        except Exception as e:
+            # Место, зарезервированное под драйвер, освобождает вызывающий код
+            logger.error(f"Ошибка при запуске WebDriver для пула: {e}")
+            return None
+        if driver is None:
+            return None
+        with self._cond:
+            self.launches += 1
+            self._pages[id(driver)] = 0
+            self._drivers[id(driver)] = driver
+        self._on_event('launch')
+        logger.info(f"Запущен новый WebDriver для пула за {time.monotonic() - started:.2f} с")
+        return driver
+
+    def _discard(self, driver):
+        """Закрытие драйвера и освобождение места в пуле"""
+        with self._cond:
+            # Драйвер мог быть уже закрыт при закрытии пула
+            if self._drivers.pop(id(driver), None) is None:
+                return
+        try:
+            self._closer(driver)
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии WebDriver из пула: {e}")
+        with self._cond:
+            self._pages.pop(id(driver), None)
+            self._total -= 1
+            self.recycled += 1
+            self._cond.notify_all()
+        self._on_event('recycle')
+
+    def is_alive(self, driver):
+        """Проверка, что браузер отвечает на команды"""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        """Выдача драйвера из пула; None, если драйвер получить не удалось за timeout секунд"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            driver = None
+            with self._cond:
+                while not self._closed and not self._idle and self._total >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        logger.error(f"Истекло время ожидания свободного WebDriver ({timeout} с)")
+                        return None
+                    self._cond.wait(remaining)
+
+                if self._closed:
+                    logger.error("Пул WebDriver закрыт, драйвер не выдан")
+                    return None
+                if self._idle:
+                    driver = self._idle.pop()
+                else:
+                    # Резервируем место под новый драйвер
+                    self._total += 1
+
+            if driver is not None:
+                if self.is_alive(driver):
+                    with self._cond:
+                        self.hits += 1
+                    self._on_event('hit')
+                    return driver
+                logger.warning("WebDriver из пула не отвечает, пересоздаем")
+                self._discard(driver)
+                continue
+
+            with self._cond:
+                self.misses += 1
+            self._on_event('miss')
+            driver = self._launch()
+            if driver is None:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+            elif self._closed:
+                # Пул закрыли, пока запускался браузер
+                self._discard(driver)
+                return None
+            return driver
+
+    def release(self, driver, broken=False, pages=1):
+        """Возврат драйвера в пул; сломанные и отработавшие свое драйверы пересоздаются
+
+        pages - сколько страниц открыто за время использования (несколько при работе вкладками).
+        """
+        if driver is None:
+            return
+
+        with self._cond:
+            if id(driver) not in self._drivers:
+                # Драйвер уже закрыт принудительно при закрытии пула
+                return
+            pages = self._pages.get(id(driver), 0) + pages
+            self._pages[id(driver)] = pages
+            closed = self._closed
+
+        if closed:
+            self._discard(driver)
+            return
+
+        if broken:
+            logger.warning("WebDriver помечен как сломанный, закрываем")
+            self._discard(driver)
+            return
+
+        if self.max_pages and pages >= self.max_pages:
+            logger.info(f"WebDriver обработал {pages} страниц, пересоздаем")
+            self._discard(driver)
+            return
+
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def warm_up(self, count=None):
+        """Предварительный запуск драйверов, чтобы первые запросы не ждали старта Chrome"""
+        count = self.max_size if count is None else min(count, self.max_size)
+        started = []
+        for _ in range(count):
+            with self._cond:
+                if self._closed or self._total >= self.max_size:
+                    break
+                self._total += 1
+            driver = self._launch()
+            if driver is None:
+                with self._cond:
+                    self._total -= 1
+                break
+            started.append(driver)
+
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._idle.extend(started)
+                self._cond.notify_all()
+        if closed:
+            for driver in started:
+                self._discard(driver)
+            return 0
+        logger.info(f"Прогрев пула WebDriver: запущено {len(started)} экземпляров")
+        return len(started)
+
+    def close(self, timeout=10):
+        """Закрытие пула: свободные драйверы закрываются сразу, выданные - при возврате
+
+        Драйверы, не возвращенные за timeout секунд, закрываются принудительно.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for driver in idle:
+            self._discard(driver)
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._drivers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            busy = list(self._drivers.values())
+        if busy:
+            logger.warning(f"Принудительно закрываются {len(busy)} WebDriver, не возвращенных в пул")
+        for driver in busy:
+            self._discard(driver)
+
+    def stats(self):
+        """Статистика использования пула"""
+        with self._cond:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'launches': self.launches,
+                'recycled': self.recycled,
+                'size': self._total,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+            }
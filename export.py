@@ -0,0 +1,195 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+
+# Необязательные зависимости: zstd-сжатие и Parquet
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# pyarrow тяжелый: загружается при первой выгрузке в Parquet, здесь только проверка наличия
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+EXPORT_COMPRESSIONS = ('gzip', 'zstd')
+
+# Колонки табличных форматов: плоские поля товара, списки - строками через запятую
+EXPORT_COLUMNS = (
+    'url', 'name', 'price', 'price_raw', 'availability', 'description',
+    'images_str', 'colors_str', 'source', 'error'
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class ExportError(Exception):
+    """Неподдерживаемый формат или сжатие либо не установлена нужная библиотека"""
+
+
+def check_export_options(fmt, compression=None):
+    """Проверка формата и сжатия до начала выгрузки"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Формат должен быть одним из: {', '.join(EXPORT_FORMATS)}")
+    if compression and compression not in EXPORT_COMPRESSIONS:
+        raise ExportError(f"Сжатие должно быть одним из: {', '.join(EXPORT_COMPRESSIONS)}")
+    if fmt == 'parquet' and not HAS_PYARROW:
+        raise ExportError("Для Parquet нужна библиотека pyarrow")
+    if compression == 'zstd' and zstandard is None and fmt != 'parquet':
+        raise ExportError("Для zstd нужна библиотека zstandard")
+
+
+def export_filename(name, fmt, compression=None):
+    # Parquet сжимается внутри файла, расширение не меняется
+    suffix = EXTENSIONS.get(compression, '') if fmt != 'parquet' else ''
+    return f"{name}.{fmt}{suffix}"
+
+
+def export_content_type(fmt, compression=None):
+    if compression and fmt != 'parquet':
+        return 'application/gzip' if compression == 'gzip' else 'application/zstd'
+    return CONTENT_TYPES[fmt]
+
+
+def _row(product):
+    """Плоская строка для табличных форматов"""
+    row = {column: product.get(column) for column in EXPORT_COLUMNS}
+    # У карточек из списка магазина вместо name поле title
+    if row['name'] is None:
+        row['name'] = product.get('title')
+    if row['images_str'] is None and product.get('images'):
+        row['images_str'] = ','.join(product['images'])
+    if row['colors_str'] is None and product.get('colors'):
+        row['colors_str'] = ','.join(c['name'] for c in product['colors'] if isinstance(c, dict))
+    if row['price_raw'] is not None:
+        row['price_raw'] = int(row['price_raw'])
+    if row['availability'] is not None:
+        row['availability'] = bool(row['availability'])
+    return row
+
+
+def _compressor(compression):
+    if compression == 'gzip':
+        # wbits=31: поток в формате gzip
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return None
+
+
+class _Buffer:
+    """Файлоподобный приемник для ParquetWriter; накопленное забирается через drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_text_chunks(products, fmt, chunk_size):
+    """CSV или JSONL порциями по chunk_size товаров"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+
+    rows = 0
+    for product in products:
+        if fmt == 'csv':
+            writer.writerow(_row(product))
+        else:
+            buffer.write(json.dumps(product, ensure_ascii=False))
+            buffer.write('\n')
+        rows += 1
+        if rows % chunk_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+
+def _iter_parquet_chunks(products, compression, chunk_size):
+    """Parquet: каждая порция товаров записывается отдельной группой строк"""
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+
+    schema = pyarrow.schema([
+        (column, pyarrow.int64() if column == 'price_raw' else
+            pyarrow.bool_() if column == 'availability' else pyarrow.string())
+        for column in EXPORT_COLUMNS
+    ])
+    sink = _Buffer()
+    writer = pyarrow_parquet.ParquetWriter(sink, schema, compression=compression or 'none')
+    try:
+        batch = []
+        for product in products:
+            batch.append(_row(product))
+            if len(batch) >= chunk_size:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                batch = []
+                yield sink.drain()
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+    finally:
+        # Футер с метаданными пишется при закрытии
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(products, fmt, compression=None, chunk_size=500):
+    """Потоковая выгрузка товаров: генератор байтовых порций готового файла
+
+    Товары читаются из products по мере поступления, в памяти держится
+    не больше chunk_size строк, поэтому выгрузку можно отдавать клиенту
+    прямо во время обхода.
+    """
+    check_export_options(fmt, compression)
+    if fmt == 'parquet':
+        for chunk in _iter_parquet_chunks(products, compression, chunk_size):
+            if chunk:
+                yield chunk
+        return
+
+    compressor = _compressor(compression)
+    # Каждая порция дожимается до границы блока, чтобы клиент получал данные сразу
+    block_flush = zlib.Z_SYNC_FLUSH if compression == 'gzip' else (
+        zstandard.COMPRESSOBJ_FLUSH_BLOCK if compression == 'zstd' else None
+    )
+    for chunk in _iter_text_chunks(products, fmt, chunk_size):
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + compressor.flush(block_flush)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
@@ -0,0 +1,66 @@
+import gc
+import os
+import shutil
+import threading
+
+# Конфигурация gunicorn
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+# Приложение загружается в мастере до fork: воркеры не повторяют импорт и делят
+# память модулей (copy-on-write). Импорт app не запускает потоков и не открывает
+# соединений: SQLite, сессии HTTP, цикл asyncio, браузеры и потоки заданий
+# создаются в воркере при первом обращении
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Метрики Prometheus собираются по всем воркерам через общий каталог
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/uzum-metrics')
+
+
+def on_starting(server):
+    """Очистка метрик прошлого запуска"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """При preload мастер заранее загружает тяжелые зависимости и замораживает объекты для сборщика мусора"""
+    if not preload_app:
+        return
+    from app import preload_backends
+    preload_backends()
+    # Замороженные объекты сборщик мусора не обходит, и страницы памяти мастера
+    # не копируются в каждый воркер при первой сборке
+    gc.freeze()
+    if threading.active_count() > 1:
+        server.log.warning(
+            f"В мастере запущены потоки ({threading.active_count() - 1}), воркеры унаследуют их блокировки"
+        )
+
+
+def post_worker_init(worker):
+    """Прогрев пула WebDriver и подхват заданий завершившихся воркеров при старте воркера"""
+    from app import driver_pool, job_manager, DRIVER_POOL_WARMUP
+    job_manager.recover()
+    if DRIVER_POOL_WARMUP:
+        driver_pool.warm_up(DRIVER_POOL_WARMUP)
+
+
+def worker_exit(server, worker):
+    """Закрытие вкладок, браузеров пула и движка asyncio при остановке воркера"""
+    from app import driver_pool, close_async_engine, product_cache, tab_scheduler
+    if tab_scheduler is not None:
+        tab_scheduler.stop()
+    driver_pool.close()
+    close_async_engine()
+    if product_cache is not None:
+        # Накопленные времена обращения и счетчики кэша
+        product_cache.flush()
+
+
+def child_exit(server, worker):
+    """Метрики завершившегося воркера больше не учитываются в живых gauge"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
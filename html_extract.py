@@ -0,0 +1,241 @@
+import importlib.util
+import logging
+import re
+import sys
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Быстрый разбор через lxml, если он установлен; иначе BeautifulSoup с html.parser.
+# Сам lxml загружается при первом разборе, здесь только проверка наличия
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+
+# Селекторы полей в порядке приоритета.
+# text: непустой текст первого совпавшего элемента, all: все элементы первого сработавшего селектора
+PRODUCT_FIELDS = {
+    'name': ('text', [
+        'h1.title', 'h1.product-title', '.product-title', '.product-name',
+        'h1[itemprop="name"]', '.product-info h1', '.product-detail h1'
+    ]),
+    'description': ('text', [
+        '.product-description', '.description', '[itemprop="description"]',
+        '.product-details', '.product-info .description', '.details-container'
+    ]),
+    'price': ('text', [
+        '.product-price', '.price', '[itemprop="price"]',
+        '.current-price', '.price-current', '.product-info .price'
+    ]),
+    'images': ('all', [
+        '.product-gallery img', '.product-images img', '.gallery img',
+        '.product-photo img', '.swiper-slide img'
+    ]),
+    'og_image': ('all', ['meta[property="og:image"]']),
+    'colors': ('all', [
+        '.colors-list .color-item', '.color-options .color-option',
+        '.color-selector .color'
+    ]),
+}
+
+# Поддерживаемая форма селектора: tag.class[attr="value"], части через пробел (потомки)
+COMPOUND_RE = re.compile(r'^([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)((?:\[[\w:-]+(?:="[^"]*")?\])*)$')
+ATTR_RE = re.compile(r'\[([\w:-]+)(?:="([^"]*)")?\]')
+
+
+class Compound:
+    """Часть селектора без комбинаторов: тег, классы, атрибуты"""
+
+    __slots__ = ('tag', 'classes', 'attrs')
+
+    def __init__(self, text):
+        match = COMPOUND_RE.match(text)
+        if not match:
+            raise ValueError(f"Неподдерживаемый селектор: {text}")
+        self.tag = match.group(1).lower() if match.group(1) else None
+        self.classes = frozenset(c for c in match.group(2).split('.') if c)
+        self.attrs = tuple(ATTR_RE.findall(match.group(3)))
+
+    def matches(self, node):
+        if self.tag and node.tag != self.tag:
+            return False
+        if self.classes and not self.classes <= node.classes:
+            return False
+        for name, value in self.attrs:
+            actual = node.get(name)
+            if actual is None or (value and actual != value):
+                return False
+        return True
+
+
+class CompiledSelector:
+    """Селектор, разобранный один раз при импорте"""
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.compounds = [Compound(part) for part in selector.split()]
+
+    def match(self, node):
+        """Последняя часть селектора - сам элемент, остальные - его предки по порядку"""
+        compounds = self.compounds
+        if not compounds[-1].matches(node):
+            return False
+        i = len(compounds) - 2
+        ancestor = node.parent() if i >= 0 else None
+        while i >= 0 and ancestor is not None:
+            if compounds[i].matches(ancestor):
+                i -= 1
+            ancestor = ancestor.parent()
+        return i < 0
+
+
+class Node:
+    """Единый интерфейс элемента lxml и BeautifulSoup (get и text как у bs4)"""
+
+    __slots__ = ('_element', '_lxml', 'tag', 'classes', '_nodes')
+
+    def __init__(self, element, is_lxml, nodes=None):
+        self._element = element
+        self._lxml = is_lxml
+        # Общие для документа узлы по id элемента: предки разбираются один раз
+        self._nodes = nodes
+        if is_lxml:
+            self.tag = element.tag if isinstance(element.tag, str) else ''
+            self.classes = frozenset((element.get('class') or '').split())
+        else:
+            self.tag = element.name
+            self.classes = frozenset(element.get('class') or ())
+
+    def get(self, name, default=None):
+        value = self._element.get(name, default)
+        if isinstance(value, list):
+            value = ' '.join(value)
+        return value
+
+    @property
+    def text(self):
+        return self._element.text_content() if self._lxml else self._element.text
+
+    def parent(self):
+        parent = self._element.getparent() if self._lxml else self._element.parent
+        if parent is None or (not self._lxml and parent.name == '[document]'):
+            return None
+        if self._nodes is None:
+            return Node(parent, self._lxml)
+        node = self._nodes.get(id(parent))
+        if node is None:
+            node = self._nodes[id(parent)] = Node(parent, self._lxml, self._nodes)
+        return node
+
+
+def parse_document(html):
+    """Разбор HTML самым быстрым доступным парсером"""
+    if HTML_PARSER == 'lxml':
+        from lxml import html as lxml_html
+        return lxml_html.document_fromstring(html)
+    # BeautifulSoup загружается только без lxml
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+
+class SelectorEngine:
+    """Извлечение полей за один обход дерева документа с заранее скомпилированными селекторами
+
+    Каждый элемент проверяется только теми селекторами, чья последняя часть
+    может с ним совпасть (по классу, тегу или атрибуту). Приоритет
+    селекторов - порядок объявления; статистика срабатываний только считается.
+    """
+
+    def __init__(self, fields):
+        self._kinds = {}
+        self._selectors = {}
+        # Индекс: класс, тег или атрибут последней части селектора -> селекторы
+        self._index = {}
+        for field, (kind, selectors) in fields.items():
+            self._kinds[field] = kind
+            self._selectors[field] = [CompiledSelector(selector) for selector in selectors]
+            for position, compiled in enumerate(self._selectors[field]):
+                last = compiled.compounds[-1]
+                if last.classes:
+                    key = ('class', min(last.classes))
+                elif last.tag:
+                    key = ('tag', last.tag)
+                else:
+                    key = ('attr', last.attrs[0][0])
+                self._index.setdefault(key, []).append((field, position, compiled))
+
+        self._wins = {field: Counter() for field in fields}
+        self._lock = threading.Lock()
+
+    def _collect(self, elements, is_lxml, candidates):
+        """Один проход по элементам документа в порядке следования"""
+        index = self._index
+        nodes = {}
+        for element in elements:
+            if is_lxml:
+                if not isinstance(element.tag, str):
+                    # Комментарии и инструкции обработки
+                    continue
+                classes = (element.get('class') or '').split()
+                tag, attrs = element.tag, element.attrib
+            else:
+                classes = element.get('class') or ()
+                tag, attrs = element.name, element.attrs
+            keys = [('class', cls) for cls in classes]
+            keys.append(('tag', tag))
+            keys.extend(('attr', name) for name in attrs)
+            node = None
+            for key in dict.fromkeys(keys):
+                for field, position, compiled in index.get(key, ()):
+                    if node is None:
+                        node = nodes.get(id(element))
+                        if node is None:
+                            node = nodes[id(element)] = Node(element, is_lxml, nodes)
+                    if compiled.match(node):
+                        candidates[field].setdefault(position, []).append(node)
+
+    def extract(self, document):
+        """Значения всех полей: строка для text, список элементов для all (None, если не найдено)
+
+        document - результат parse_document либо готовый объект BeautifulSoup.
+        """
+        candidates = {field: {} for field in self._selectors}
+        # Документ lxml мог появиться, только если lxml.html уже загружен
+        lxml_html = sys.modules.get('lxml.html')
+        if lxml_html is not None and isinstance(document, lxml_html.HtmlElement):
+            self._collect(document.iter(), True, candidates)
+        else:
+            self._collect(document.find_all(True), False, candidates)
+
+        result = {}
+        wins = []
+        for field, matched in candidates.items():
+            value = None
+            for position in range(len(self._selectors[field])):
+                nodes = matched.get(position)
+                if not nodes:
+                    continue
+                if self._kinds[field] == 'text':
+                    # Как select_one: учитывается первый элемент селектора
+                    value = nodes[0].text.strip() or None
+                else:
+                    value = nodes
+                if value:
+                    wins.append((field, position))
+                    break
+            result[field] = value
+
+        with self._lock:
+            for field, position in wins:
+                self._wins[field][position] += 1
+        return result
+
+    def stats(self):
+        """Сколько раз срабатывал каждый селектор"""
+        with self._lock:
+            return {
+                field: {self._selectors[field][position].selector: count for position, count in wins.items()}
+                for field, wins in self._wins.items()
+            }
+
+
+product_selectors = SelectorEngine(PRODUCT_FIELDS)
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Размерные варианты одной фотографии на CDN: .../<id>/t_product_540_high.jpg, t_product_240_low.jpg, original.jpg
+CDN_VARIANT_RE = re.compile(
+    r'^(?P<base>.+/)(?:t_product(?:_(?P<size>\d+))?_(?P<quality>low|high)|(?P<original>original))\.(?:jpe?g|webp|png)$'
+)
+# Параметры ресайза в строке запроса не меняют саму фотографию
+SIZE_PARAMS = frozenset(('w', 'h', 'width', 'height', 'size', 'quality', 'q', 'fit'))
+
+
+def _variant_rank(match):
+    """Чем больше, тем крупнее вариант: оригинал, затем по размеру и качеству"""
+    if match.group('original'):
+        return (1, 0, 0)
+    return (0, int(match.group('size') or 0), 1 if match.group('quality') == 'high' else 0)
+
+
+def normalize_image_url(url, base_url):
+    """Абсолютный https-URL без фрагмента и параметров размера (None для пустых и data:)"""
+    if not isinstance(url, str):
+        return None
+    url = url.strip()
+    if not url or url.startswith('data:'):
+        return None
+    if url.startswith('//'):
+        url = 'https:' + url
+    elif not url.startswith(('http://', 'https://')):
+        url = urljoin(base_url, url)
+
+    parts = urlsplit(url)
+    query = '&'.join(
+        param for param in parts.query.split('&')
+        if param and param.split('=', 1)[0].lower() not in SIZE_PARAMS
+    )
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ''))
+
+
+class ImagePipeline:
+    """Нормализация URL изображений и отбор одного варианта каждой фотографии
+
+    Размерные варианты одной фотографии на CDN считаются повторами: остается
+    самый крупный из найденных URL, порядок фотографий сохраняется.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def _key(self, url):
+        """Ключ фотографии (общий для всех ее вариантов) и ранг варианта для нормализованного URL"""
+        match = CDN_VARIANT_RE.match(url)
+        if match:
+            return match.group('base'), _variant_rank(match)
+        return url, ()
+
+    def process(self, urls):
+        """Нормализованные URL без повторов в исходном порядке, по одному на фотографию"""
+        best = {}
+        for url in urls:
+            url = normalize_image_url(url, self.base_url)
+            if url is None:
+                continue
+            key, rank = self._key(url)
+            found = best.get(key)
+            if found is None or rank > found[0]:
+                best[key] = (rank, url)
+        return [url for _, url in best.values()]
+
+
+class ImageCache(SQLiteStore):
+    """Локальный кэш изображений с адресацией по содержимому
+
+    Файл хранится под SHA-256 своего содержимого, поэтому одинаковые
+    фотографии по разным URL занимают место один раз. Для URL запоминаются
+    ETag/Last-Modified, и повторная загрузка выполняется условным запросом.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, directory, fetch, max_age=7 * 86400, timeout=10):
+        # fetch(url, **kwargs) выполняет GET и возвращает ответ requests
+        super().__init__(os.path.join(directory, 'index.sqlite3'))
+        self.directory = directory
+        self._fetch = fetch
+        self.max_age = max_age
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {'downloaded': 0, 'not_modified': 0, 'fresh': 0, 'failed': 0, 'bytes': 0}
+
+    def path_for(self, sha256):
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def fetch(self, url):
+        """Загрузка изображения в кэш; возвращает путь к файлу или None при ошибке"""
+        try:
+            row = self.execute('SELECT * FROM images WHERE url = ?', (url,)).fetchone()
+            now = time.time()
+            if row and os.path.exists(self.path_for(row['sha256'])):
+                if now - row['fetched_at'] < self.max_age:
+                    self._count('fresh')
+                    return self.path_for(row['sha256'])
+                headers = {}
+                if row['etag']:
+                    headers['If-None-Match'] = row['etag']
+                if row['last_modified']:
+                    headers['If-Modified-Since'] = row['last_modified']
+            else:
+                row = None
+                headers = {}
+
+            response = self._fetch(url, headers=headers or None, timeout=self.timeout)
+            if response.status_code == 304 and row:
+                self.execute('UPDATE images SET fetched_at = ? WHERE url = ?', (now, url))
+                self._count('not_modified')
+                return self.path_for(row['sha256'])
+            if response.status_code != 200:
+                logger.warning(f"HTTP {response.status_code} при загрузке изображения {url}")
+                self._count('failed')
+                return None
+
+            content = response.content
+            sha256 = hashlib.sha256(content).hexdigest()
+            path = self.path_for(sha256)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Запись через временный файл, чтобы параллельные загрузки не видели половину файла
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            self.execute(
+                'INSERT OR REPLACE INTO images (url, sha256, size, content_type, etag, last_modified, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, sha256, len(content), response.headers.get('Content-Type'),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now)
+            )
+            self._count('downloaded')
+            self._count('bytes', len(content))
+            return path
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке изображения {url}: {e}")
+            self._count('failed')
+            return None
+
+    def iter_prefetch(self, products, concurrency=4):
+        """Пропускает товары дальше без изменений, параллельно загружая их изображения в кэш
+
+        Изображение, уже встречавшееся в каталоге, повторно не запрашивается.
+        """
+        seen = set()
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='uzum-images')
+        pending = set()
+        try:
+            for product in products:
+                for url in product.get('images') or ():
+                    if url in seen:
+                        continue
+                    seen.add(url)
+                    pending.add(executor.submit(self.fetch, url))
+                    # Не набираем очередь больше, чем успеваем загрузить
+                    while len(pending) >= concurrency * 4:
+                        _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield product
+            wait(pending)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+        result['entries'] = self.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+        return result
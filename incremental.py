@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import time
+
+from crawl_state import ShopCrawlState
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+def listing_fingerprint(listing):
+    """Отпечаток карточки товара: цена, наличие и хэш списка изображений"""
+    images_hash = hashlib.sha1('\n'.join(listing.get('images') or []).encode('utf-8')).hexdigest()
+    payload = json.dumps([listing.get('price_raw'), listing.get('availability'), images_hash])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CrawlStateStore(SQLiteStore):
+    """Результаты предыдущего обхода магазинов: ID товаров и отпечатки карточек"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS shop_items (
+            shop_id TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            price_raw INTEGER,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (shop_id, product_id)
+        );
+    '''
+
+    def load(self, shop_id):
+        rows = self.execute(
+            'SELECT product_id, url, fingerprint, price_raw FROM shop_items WHERE shop_id = ?', (shop_id,)
+        ).fetchall()
+        return {row['product_id']: dict(row) for row in rows}
+
+    def save(self, shop_id, listings, removed_ids):
+        """Запись карточек текущего обхода и удаление исчезнувших товаров"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO shop_items '
+                '(shop_id, product_id, url, fingerprint, price_raw, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (shop_id, product_id, listing['url'], listing_fingerprint(listing), listing.get('price_raw'), now)
+                    for product_id, listing in listings.items()
+                ]
+            )
+            conn.executemany(
+                'DELETE FROM shop_items WHERE shop_id = ? AND product_id = ?',
+                [(shop_id, product_id) for product_id in removed_ids]
+            )
+
+
+class IncrementalCrawler:
+    """Повторный обход магазина с получением данных только для новых и изменившихся товаров"""
+
+    def __init__(self, parser, store):
+        self.parser = parser
+        self.store = store
+
+    def crawl(self, shop_url, max_pages=None, concurrency=None, with_details=True):
+        """Обход магазина; возвращает разницу с предыдущим обходом"""
+        shop_id = shop_url.split('/')[-1].split('?')[0]
+        previous = self.store.load(shop_id)
+        state = ShopCrawlState(shop_id)
+        logger.info(f"Инкрементальный обход магазина {shop_id}, в прошлом обходе {len(previous)} товаров")
+
+        current = {}
+        added = []
+        changed = []
+        price_changed = []
+        for listing in self.parser.iter_shop_listings(shop_url, max_pages=max_pages, state=state):
+            product_id = listing['product_id'] or listing['url']
+            current[product_id] = listing
+
+            old = previous.get(product_id)
+            if old is None:
+                added.append(listing)
+            elif old['fingerprint'] != listing_fingerprint(listing):
+                changed.append(listing)
+                if old['price_raw'] != listing.get('price_raw'):
+                    price_changed.append({
+                        'product_id': product_id,
+                        'url': listing['url'],
+                        'old_price': old['price_raw'],
+                        'new_price': listing.get('price_raw'),
+                    })
+
+        # Исчезнувшие товары можно определить только по полному обходу
+        removed = []
+        if state.complete and current:
+            removed = [
+                {'product_id': product_id, 'url': old['url']}
+                for product_id, old in previous.items() if product_id not in current
+            ]
+        else:
+            logger.warning(f"Обход магазина {shop_id} неполный, удаленные товары не определяются")
+
+        details = {}
+        to_fetch = [listing['url'] for listing in added + changed]
+        if with_details and to_fetch:
+            logger.info(f"Получение данных для {len(to_fetch)} новых и изменившихся товаров")
+            for result in self.parser.iter_products_details(to_fetch, concurrency=concurrency):
+                details[result['url']] = result
+
+        # Товары, по которым не удалось получить данные, не запоминаем, чтобы повторить их в следующий раз
+        failed_urls = {url for url, result in details.items() if result['error']}
+        saved = {product_id: listing for product_id, listing in current.items() if listing['url'] not in failed_urls}
+        self.store.save(shop_id, saved, [item['product_id'] for item in removed])
+
+        def with_product(listing):
+            result = details.get(listing['url'])
+            product = result['product'] if result else None
+            return dict(listing, product=product.to_dict() if product else None)
+
+        logger.info(
+            f"Магазин {shop_id}: новых {len(added)}, изменившихся {len(changed)}, "
+            f"удаленных {len(removed)}, без изменений {len(current) - len(added) - len(changed)}"
+        )
+        return {
+            'shop_id': shop_id,
+            'complete': state.complete,
+            'total': len(current),
+            'added': [with_product(listing) for listing in added],
+            'changed': [with_product(listing) for listing in changed],
+            'price_changed': price_changed,
+            'removed': removed,
+            'unchanged': len(current) - len(added) - len(changed),
+        }
@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Очередь заданий заполнена"""
+
+
+def pid_alive(pid):
+    """Процесс с таким pid еще работает (воркеры делят каталог данных на одном хосте)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore(SQLiteStore):
+    """Состояние и результаты заданий в SQLite, доступные всем воркерам"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (job_id, seq)
+        );
+    '''
+
+    def create(self, kind, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.execute(
+            'INSERT INTO jobs (id, kind, params, status, worker_pid, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(params, ensure_ascii=False), 'queued', os.getpid(), now, now)
+        )
+        return job_id
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        self.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def delete(self, job_id):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def unfinished(self):
+        """Задания в очереди или в работе: [(id, kind, params, status, worker_pid)]"""
+        rows = self.execute(
+            "SELECT id, kind, params, status, worker_pid FROM jobs WHERE status IN ('queued', 'running') "
+            "ORDER BY created_at"
+        ).fetchall()
+        return [(row['id'], row['kind'], json.loads(row['params']), row['status'], row['worker_pid']) for row in rows]
+
+    def claim(self, job_id, expected_status, expected_pid, **fields):
+        """Перехват задания у завершившегося воркера; False, если его уже перехватил другой"""
+        fields['worker_pid'] = os.getpid()
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        cursor = self.execute(
+            f'UPDATE jobs SET {columns} WHERE id = ? AND status = ? AND worker_pid = ?',
+            (*fields.values(), job_id, expected_status, expected_pid)
+        )
+        return cursor.rowcount > 0
+
+    def add_result(self, job_id, seq, item):
+        """Результат и прогресс задания одной транзакцией"""
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO job_results (job_id, seq, payload) VALUES (?, ?, ?)',
+                (job_id, seq, json.dumps(item, ensure_ascii=False))
+            )
+            conn.execute(
+                'UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?',
+                (seq + 1, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        row = self.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['results_count'] = self.execute(
+            'SELECT COUNT(*) FROM job_results WHERE job_id = ?', (job_id,)
+        ).fetchone()[0]
+        return job
+
+    def results(self, job_id, offset=0, limit=100):
+        rows = self.execute(
+            'SELECT payload FROM job_results WHERE job_id = ? ORDER BY seq LIMIT ? OFFSET ?',
+            (job_id, limit, offset)
+        ).fetchall()
+        return [json.loads(row['payload']) for row in rows]
+
+
+class JobContext:
+    """Интерфейс выполняемого задания для обработчика"""
+
+    def __init__(self, store, job_id):
+        self._store = store
+        self.job_id = job_id
+        self._seq = 0
+
+    def add_result(self, item):
+        self._store.add_result(self.job_id, self._seq, item)
+        self._seq += 1
+
+    def set_total(self, total):
+        self._store.update(self.job_id, total=total)
+
+
+class JobManager:
+    """Фоновое выполнение заданий с ограниченной очередью"""
+
+    def __init__(self, store, workers=2, queue_size=20):
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self._handlers = {}
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, kind, handler):
+        """Регистрация обработчика handler(context, params) для типа заданий"""
+        self._handlers[kind] = handler
+
+    def _ensure_started(self):
+        """Запуск потоков-исполнителей в текущем процессе (после fork создаются заново)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'uzum-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def submit(self, kind, params):
+        """Постановка задания в очередь; QueueFullError, если очередь заполнена"""
+        if kind not in self._handlers:
+            raise ValueError(f"Неизвестный тип задания: {kind}")
+        self._ensure_started()
+
+        job_id = self.store.create(kind, params)
+        try:
+            self._queue.put_nowait((job_id, kind, params))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise QueueFullError("Очередь заданий заполнена")
+        logger.info(f"Задание {job_id} ({kind}) поставлено в очередь")
+        return job_id
+
+    def recover(self):
+        """Задания воркеров, которые завершились, не доведя их до конца (вызывается при старте воркера)
+
+        Очередь заданий живет в памяти воркера, и после его гибели или
+        перезапуска записи остаются в SQLite в статусе queued/running.
+        Не начатые задания ставятся в очередь этого воркера, прерванные
+        помечаются ошибкой: повторный запуск мог бы снова уронить воркер
+        (обход магазина при повторной отправке продолжится с контрольной точки).
+        """
+        requeued = failed = 0
+        for job_id, kind, params, status, worker_pid in self.store.unfinished():
+            if worker_pid != os.getpid() and pid_alive(worker_pid):
+                continue
+            if status == 'running' or kind not in self._handlers:
+                error = (
+                    'Воркер завершился во время выполнения задания' if status == 'running'
+                    else f'Неизвестный тип задания: {kind}'
+                )
+                if self.store.claim(job_id, status, worker_pid, status='failed', error=error):
+                    failed += 1
+                continue
+            self._ensure_started()
+            if self._queue.full():
+                break
+            if self.store.claim(job_id, status, worker_pid):
+                try:
+                    self._queue.put_nowait((job_id, kind, params))
+                except queue.Full:
+                    # Очередь заполнили новые задания: оставляем для следующего воркера
+                    self.store.update(job_id, worker_pid=worker_pid)
+                    break
+                requeued += 1
+        if requeued or failed:
+            logger.warning(
+                f"Задания завершившихся воркеров: {requeued} снова в очереди, {failed} помечены ошибкой"
+            )
+        return requeued, failed
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _run(self):
+        while True:
+            job_id, kind, params = self._queue.get()
+            try:
+                self._execute(job_id, kind, params)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job_id, kind, params):
+        logger.info(f"Запуск задания {job_id} ({kind})")
+        self.store.update(job_id, status='running', worker_pid=os.getpid())
+        try:
+            self._handlers[kind](JobContext(self.store, job_id), params)
+            self.store.update(job_id, status='done')
+            logger.info(f"Задание {job_id} выполнено")
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении задания {job_id}: {e}")
+            self.store.update(job_id, status='failed', error=str(e))
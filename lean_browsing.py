@@ -0,0 +1,134 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Ресурсы, которые не нужны парсеру: данные берутся из JS-состояния и атрибутов src
+BLOCKED_EXTENSIONS = [
+    # Изображения
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico',
+    # Шрифты
+    'woff', 'woff2', 'ttf', 'otf', 'eot',
+    # Видео и аудио
+    'mp4', 'webm', 'm3u8', 'mp3', 'ogg',
+]
+# Вариант с '?*' нужен для адресов CDN с параметрами (image.jpg?w=800)
+BLOCKED_RESOURCE_PATTERNS = [f'*.{ext}{suffix}' for ext in BLOCKED_EXTENSIONS for suffix in ('', '?*')]
+
+BLOCKED_TRACKER_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*mc.yandex.ru*', '*mc.yandex.com*', '*facebook.net*', '*connect.facebook.com*',
+    '*hotjar.com*', '*analytics.tiktok.com*', '*clarity.ms*', '*criteo.com*',
+]
+
+# Объем загруженного и время загрузки страницы по Performance API.
+# bytes - нижняя оценка: у ресурсов с других доменов без Timing-Allow-Origin
+# (большая часть CDN) размер не виден и равен 0, такие ресурсы считаются в opaque.
+# Замер делается в момент готовности страницы для парсера (при eager - до
+# окончания загрузки), то есть учитывается то, что было загружено к этому моменту
+PAGE_METRICS_JS = """
+    const nav = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    let bytes = nav ? (nav.transferSize || 0) : 0;
+    let opaque = 0;
+    for (const r of resources) {
+        bytes += r.transferSize || 0;
+        if (!r.transferSize && !r.decodedBodySize) {
+            opaque += 1;
+        }
+    }
+    return {
+        bytes: bytes,
+        resources: resources.length,
+        opaque: opaque,
+        load_ms: nav ? Math.round(nav.domContentLoadedEventEnd - nav.startTime) : null
+    };
+"""
+
+
+def set_resource_blocking(driver, patterns):
+    """Включение (или отключение при пустом списке) блокировки запросов через CDP в текущей вкладке
+
+    Network.setBlockedURLs действует на одну вкладку, поэтому уже заданные
+    шаблоны запоминаются по дескриптору окна.
+    """
+    handle = driver.current_window_handle
+    applied = getattr(driver, '_uzum_blocked_patterns', None)
+    if applied is None:
+        applied = driver._uzum_blocked_patterns = {}
+    if applied.get(handle) == patterns:
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    if handle not in applied and applied:
+        # Новая вкладка: заодно забываем закрытые
+        open_handles = set(driver.window_handles)
+        for stale in [h for h in applied if h not in open_handles]:
+            del applied[stale]
+    applied[handle] = patterns
+
+
+def collect_page_metrics(driver):
+    """Объем и время загрузки текущей страницы"""
+    try:
+        return driver.execute_script(PAGE_METRICS_JS)
+    except Exception as e:
+        logger.error(f"Ошибка при сборе метрик загрузки страницы: {e}")
+        return None
+
+
+class LeanStats:
+    """Сравнение загрузки страниц с блокировкой ресурсов и без нее (контрольные страницы)
+
+    Байты - нижняя оценка (см. PAGE_METRICS_JS), поэтому и экономия по байтам
+    занижена; opaque показывает, сколько ресурсов в среднем не попало в оценку.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = 0
+        self._samples = {
+            'lean': {'pages': 0, 'bytes': 0, 'load_ms': 0, 'opaque': 0},
+            'baseline': {'pages': 0, 'bytes': 0, 'load_ms': 0, 'opaque': 0},
+        }
+
+    def next_is_baseline(self, every):
+        """Каждая every-я страница загружается без блокировки для оценки экономии"""
+        with self._lock:
+            self._pages += 1
+            return bool(every) and self._pages % every == 0
+
+    def record(self, metrics, baseline):
+        """Учет страницы; возвращает оценку сэкономленных байт и миллисекунд для lean-страницы"""
+        with self._lock:
+            sample = self._samples['baseline' if baseline else 'lean']
+            sample['pages'] += 1
+            sample['bytes'] += metrics.get('bytes') or 0
+            sample['load_ms'] += metrics.get('load_ms') or 0
+            sample['opaque'] += metrics.get('opaque') or 0
+
+            reference = self._samples['baseline']
+            if baseline or not reference['pages']:
+                return None
+            return {
+                'bytes': reference['bytes'] / reference['pages'] - (metrics.get('bytes') or 0),
+                'load_ms': reference['load_ms'] / reference['pages'] - (metrics.get('load_ms') or 0),
+            }
+
+    def snapshot(self):
+        with self._lock:
+            result = {'bytes_lower_bound': True}
+            for name, sample in self._samples.items():
+                pages = sample['pages']
+                result[name] = {
+                    'pages': pages,
+                    'avg_bytes': sample['bytes'] / pages if pages else 0,
+                    'avg_load_ms': sample['load_ms'] / pages if pages else 0,
+                    'avg_opaque_resources': sample['opaque'] / pages if pages else 0,
+                }
+            if result['lean']['pages'] and result['baseline']['pages']:
+                result['saved_per_page'] = {
+                    'bytes': result['baseline']['avg_bytes'] - result['lean']['avg_bytes'],
+                    'load_ms': result['baseline']['avg_load_ms'] - result['lean']['avg_load_ms'],
+                }
+            return result
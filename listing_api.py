@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Ключи, под которыми API каталога отдает список товаров и их общее число
+ITEMS_KEYS = ('products', 'items', 'content', 'productList')
+TOTAL_KEYS = ('total', 'totalElements', 'totalProducts', 'count')
+PRICE_KEYS = ('sellPrice', 'minSellPrice', 'price', 'purchasePrice')
+
+
+class ListingApiError(Exception):
+    """API каталога не ответило или вернуло данные в неизвестном формате"""
+
+
+def parse_listing_page(payload):
+    """Товары страницы и общее число товаров магазина (None, если API его не сообщает)"""
+    data = payload
+    # Ответ может быть обернут в payload/data
+    for key in ('payload', 'data'):
+        if isinstance(data, dict) and isinstance(data.get(key), dict):
+            data = data[key]
+    if not isinstance(data, dict):
+        raise ListingApiError("Ответ API каталога не является объектом")
+
+    items = next((data[key] for key in ITEMS_KEYS if isinstance(data.get(key), list)), None)
+    if items is None:
+        raise ListingApiError("В ответе API каталога нет списка товаров")
+    total = next((data[key] for key in TOTAL_KEYS if isinstance(data.get(key), int)), None)
+    return items, total
+
+
+def _photo_url(photo):
+    if isinstance(photo, str):
+        return photo
+    if isinstance(photo, dict):
+        for key in ('url', 'link', 'high', 'photo'):
+            value = photo.get(key)
+            if isinstance(value, str):
+                return value
+            if isinstance(value, dict):
+                nested = _photo_url(value)
+                if nested:
+                    return nested
+    return None
+
+
+def shop_product_base(shop_url):
+    """Адрес, к которому добавляется slug товара: сайт магазина и языковой префикс (/ru, /uz)"""
+    parsed = urlparse(shop_url)
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    locale = f"/{segments[0]}" if segments and len(segments[0]) == 2 and segments[0].isalpha() else ''
+    return f"{parsed.scheme}://{parsed.netloc}{locale}/product"
+
+
+def listing_card(item, product_base_url):
+    """Товар из API в виде карточки магазина (тот же формат, что дает разбор страницы)"""
+    product_id = item.get('productId') or item.get('id')
+    slug = item.get('slug') or product_id
+    if not slug:
+        return None
+
+    price = next((item[key] for key in PRICE_KEYS if isinstance(item.get(key), (int, float))), None)
+    photos = item.get('photos') or item.get('images') or []
+    amount = item.get('totalAvailableAmount')
+    return {
+        'url': f"{product_base_url}/{slug}",
+        'title': item.get('title') or item.get('name') or '',
+        'price_text': str(int(price)) if price is not None else '',
+        'images': [url for url in (_photo_url(photo) for photo in photos) if url],
+        'unavailable': item.get('available') is False or amount == 0,
+    }
+
+
+class ListingApiClient:
+    """Постраничное получение товаров магазина через API каталога
+
+    Страницы нумеруются с нуля. Первая страница запрашивается отдельно, чтобы
+    узнать общее число товаров, остальные - параллельно.
+    """
+
+    def __init__(self, fetch, url_template, page_size=100, concurrency=4, timeout=10, async_fetch=None):
+        # fetch(url, **kwargs) выполняет GET и возвращает ответ requests,
+        # async_fetch(url, headers, params) - то же для цикла asyncio,
+        # url_template содержит {shop_id}
+        self._fetch = fetch
+        self._async_fetch = async_fetch
+        self.url_template = url_template
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def fetch_page(self, shop_id, page):
+        """Товары одной страницы и общее число товаров"""
+        response = self._fetch(
+            self.url_template.format(shop_id=shop_id),
+            params={'page': page, 'size': self.page_size},
+            headers={'Accept': 'application/json'},
+            timeout=self.timeout
+        )
+        return self._parse_response(response)
+
+    async def fetch_page_async(self, shop_id, page):
+        """То же, что fetch_page, через асинхронный клиент"""
+        response = await self._async_fetch(
+            self.url_template.format(shop_id=shop_id),
+            headers={'Accept': 'application/json'},
+            params={'page': page, 'size': self.page_size}
+        )
+        return self._parse_response(response)
+
+    def _parse_response(self, response):
+        if response.status_code != 200:
+            raise ListingApiError(f"HTTP {response.status_code} от API каталога")
+        try:
+            payload = response.json()
+        except ValueError:
+            raise ListingApiError("API каталога вернуло не JSON")
+        return parse_listing_page(payload)
+
+    def page_count(self, total):
+        return -(-total // self.page_size)
+
+    def iter_pages(self, shop_id, pages):
+        """Параллельная загрузка страниц; результаты выдаются по порядку страниц
+
+        Загружается не больше concurrency страниц вперед: следующая страница
+        запрашивается, когда потребитель забирает очередную.
+        """
+        window = max(1, self.concurrency)
+        remaining = iter(pages)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(window, len(pages))))
+        pending = deque((page, executor.submit(self.fetch_page, shop_id, page)) for page in islice(remaining, window))
+        try:
+            while pending:
+                page, future = pending.popleft()
+                items, _ = future.result()
+                for next_page in islice(remaining, 1):
+                    pending.append((next_page, executor.submit(self.fetch_page, shop_id, next_page)))
+                yield page, items
+        finally:
+            # При досрочной остановке обхода незапущенные запросы отменяются
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def iter_pages_async(self, shop_id, pages):
+        """Асинхронная загрузка страниц не более concurrency вперед, по порядку страниц"""
+        window = max(1, self.concurrency)
+        remaining = iter(pages)
+        pending = deque(
+            (page, asyncio.ensure_future(self.fetch_page_async(shop_id, page))) for page in islice(remaining, window)
+        )
+        try:
+            while pending:
+                page, task = pending.popleft()
+                items, _ = await task
+                for next_page in islice(remaining, 1):
+                    pending.append((next_page, asyncio.ensure_future(self.fetch_page_async(shop_id, next_page))))
+                yield page, items
+        finally:
+            for _, task in pending:
+                task.cancel()
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы гистограмм: от быстрых разборов HTML до долгого обхода магазина
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class _LazyMetric:
+    """Метрика Prometheus, создаваемая при первом обращении
+
+    prometheus_client загружается при первом обращении к метрике (или заранее,
+    в preload_backends), а не при импорте приложения.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, kind, name, documentation, labelnames, **kwargs):
+        self._args = (kind, name, documentation, labelnames, kwargs)
+        self._metric = None
+
+    def get(self):
+        metric = self._metric
+        if metric is None:
+            with self._lock:
+                if self._metric is None:
+                    import prometheus_client
+                    kind, name, documentation, labelnames, kwargs = self._args
+                    self._metric = getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+                metric = self._metric
+        return metric
+
+    def labels(self, *values):
+        return self.get().labels(*values)
+
+
+STAGE_SECONDS = _LazyMetric(
+    'Histogram', 'uzum_stage_seconds', 'Длительность стадий парсера', ['stage'], buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = _LazyMetric(
+    'Counter', 'uzum_stage_failures_total', 'Ошибки по стадиям парсера', ['stage']
+)
+EXTRACTION_TOTAL = _LazyMetric(
+    'Counter', 'uzum_extraction_total', 'Полученные товары по способу извлечения', ['path']
+)
+DRIVER_POOL_EVENTS = _LazyMetric(
+    'Counter', 'uzum_driver_pool_events_total', 'События пула WebDriver', ['event']
+)
+CACHE_EVENTS = _LazyMetric(
+    'Counter', 'uzum_product_cache_events_total', 'Обращения к кэшу товаров', ['result']
+)
+THROTTLE_EVENTS = _LazyMetric(
+    'Counter', 'uzum_throttle_events_total', 'Ограничение частоты запросов и повторы', ['event']
+)
+TAB_EVENTS = _LazyMetric(
+    'Counter', 'uzum_tab_events_total', 'Работа вкладок браузера при параллельной отрисовке', ['event']
+)
+_METRICS = (
+    STAGE_SECONDS, STAGE_FAILURES, EXTRACTION_TOTAL, DRIVER_POOL_EVENTS, CACHE_EVENTS, THROTTLE_EVENTS, TAB_EVENTS
+)
+
+
+@contextmanager
+def span(stage):
+    """Замер стадии; исключение, вышедшее из блока, считается ошибкой стадии"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def record_stage(stage, seconds):
+    """Учет стадии, длительность которой замерена отдельно (например, ожидание во вкладке)"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def timed_iter(iterable, stage):
+    """Элементы итератора; стадия учитывает только ожидание элементов, без работы потребителя"""
+    iterator = iter(iterable)
+    waited = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                STAGE_FAILURES.labels(stage).inc()
+                raise
+            finally:
+                waited += time.perf_counter() - started
+            yield item
+    finally:
+        STAGE_SECONDS.labels(stage).observe(waited)
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+
+async def timed_aiter(iterable, stage):
+    """То же для асинхронного итератора"""
+    iterator = iterable.__aiter__()
+    waited = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception:
+                STAGE_FAILURES.labels(stage).inc()
+                raise
+            finally:
+                waited += time.perf_counter() - started
+            yield item
+    finally:
+        STAGE_SECONDS.labels(stage).observe(waited)
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+
+def record_failure(stage):
+    """Учет ошибки стадии, которая была обработана без исключения"""
+    STAGE_FAILURES.labels(stage).inc()
+
+
+def render():
+    """Метрики в текстовом формате Prometheus; под gunicorn - суммарно по всем воркерам"""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+    # В выдаче должны быть все метрики, в том числе еще не использованные
+    for metric in _METRICS:
+        metric.get()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
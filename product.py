@@ -0,0 +1,88 @@
+class Product:
+    """Запись о товаре с фиксированной схемой
+
+    Хранятся только исходные значения; строковые поля для выгрузки
+    (price, images_str, colors_str) вычисляются при обращении.
+    """
+
+    __slots__ = ('url', 'name', 'description', 'price_raw', 'images', 'colors', 'availability', 'source', 'price_text')
+
+    DEFAULT_NAME = 'Название не найдено'
+    DEFAULT_DESCRIPTION = 'Описание отсутствует'
+    DEFAULT_PRICE = 'Цена не указана'
+
+    def __init__(self, url=None, name=None, description=None, price_raw=0, images=(), colors=(),
+                 availability=True, source=None, price_text=None):
+        # images - кортеж URL, colors - кортеж пар (название, ID);
+        # price_text - цена в том виде, как она указана на странице, если ее нельзя получить из price_raw
+        self.url = url
+        self.name = name or self.DEFAULT_NAME
+        self.description = description or self.DEFAULT_DESCRIPTION
+        self.price_raw = price_raw or 0
+        self.images = tuple(images)
+        self.colors = tuple(colors)
+        self.availability = availability
+        self.source = source
+        self.price_text = price_text
+
+    @staticmethod
+    def format_price(price_raw):
+        return f"{price_raw:,.0f} сум" if price_raw else Product.DEFAULT_PRICE
+
+    @property
+    def price(self):
+        return self.price_text or self.format_price(self.price_raw)
+
+    @property
+    def images_str(self):
+        return ','.join(self.images)
+
+    @property
+    def colors_str(self):
+        return ','.join(name for name, _ in self.colors)
+
+    def replace(self, **changes):
+        """Копия записи с измененными полями"""
+        product = Product.__new__(Product)
+        for name in self.__slots__:
+            setattr(product, name, changes.get(name, getattr(self, name)))
+        return product
+
+    def to_dict(self):
+        """Словарь в прежнем формате API (со строковыми полями для импорта)"""
+        images = self.images
+        colors = self.colors
+        return {
+            'name': self.name,
+            'description': self.description,
+            'price': self.price_text or self.format_price(self.price_raw),
+            'price_raw': self.price_raw,
+            'images': list(images),
+            'images_str': ','.join(images),
+            'colors': [{'name': name, 'id': color_id} for name, color_id in colors],
+            'colors_str': ','.join(name for name, _ in colors),
+            'availability': self.availability,
+            'url': self.url,
+            'source': self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, data, **changes):
+        """Запись из словаря в формате to_dict (например, из кэша)"""
+        price_raw = data.get('price_raw') or 0
+        price = data.get('price')
+        product = cls(
+            url=data.get('url'),
+            name=data.get('name'),
+            description=data.get('description'),
+            price_raw=price_raw,
+            images=data.get('images') or (),
+            colors=((c.get('name'), c.get('id', '')) for c in data.get('colors') or () if isinstance(c, dict)),
+            availability=data.get('availability', True),
+            source=data.get('source'),
+            price_text=price if price and price != cls.format_price(price_raw) else None,
+        )
+        return product.replace(**changes) if changes else product
+
+    def __repr__(self):
+        return f"Product(url={self.url!r}, name={self.name!r}, price_raw={self.price_raw!r}, source={self.source!r})"
@@ -0,0 +1,234 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые быстро устаревают; остальные (название, описание, изображения) меняются редко
+VOLATILE_FIELDS = ('price', 'price_raw', 'availability')
+
+
+class CacheEntry:
+    """Запись кэша товара"""
+
+    def __init__(self, product, fresh, etag=None, last_modified=None):
+        self.product = product
+        self.fresh = fresh
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def validators(self):
+        """Заголовки для условного запроса"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ProductCache(SQLiteStore):
+    """Кэш товаров в SQLite с раздельными TTL и вытеснением давно не использованных записей
+
+    Цена и наличие живут volatile_ttl, остальные данные - static_ttl. Карточки
+    из списка товаров магазина обновляют цену и наличие (update_volatile_many),
+    и запись остается свежей без загрузки страницы товара.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            static_data TEXT NOT NULL,
+            volatile_data TEXT NOT NULL,
+            static_at REAL NOT NULL,
+            volatile_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            etag TEXT,
+            last_modified TEXT
+        );
+        CREATE INDEX IF NOT EXISTS products_accessed_at ON products (accessed_at);
+        CREATE TABLE IF NOT EXISTS cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        );
+    '''
+
+    def __init__(self, path, volatile_ttl=900, static_ttl=86400, max_entries=100000, on_event=None,
+                 flush_every=100, flush_interval=5.0, evict_every=500):
+        super().__init__(path)
+        self._on_event = on_event or (lambda event: None)
+        self.volatile_ttl = volatile_ttl
+        self.static_ttl = static_ttl
+        self.max_entries = max_entries
+        # Подсчет записей - полный проход по таблице, поэтому вытеснение проверяется
+        # раз в evict_every сохранений; кэш может ненадолго превысить max_entries
+        self.evict_every = evict_every
+        self._puts_since_evict = 0
+        # Чтение ничего не пишет: время обращения и счетчики копятся в памяти
+        # и записываются одной транзакцией раз в flush_every чтений или flush_interval секунд
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending_lock = threading.Lock()
+        self._pending_access = {}
+        self._pending_counts = Counter()
+        self._flushed_at = time.monotonic()
+
+    def _count(self, name, product_id=None, now=None, amount=1):
+        """Учет обращения; в SQLite попадает при следующей записи порции"""
+        self._on_event(name)
+        with self._pending_lock:
+            self._pending_counts[name] += amount
+            if product_id is not None:
+                self._pending_access[product_id] = now
+            due = (
+                len(self._pending_access) + sum(self._pending_counts.values()) >= self.flush_every
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленных времен обращения и счетчиков (общих для всех воркеров)"""
+        with self._pending_lock:
+            access, self._pending_access = self._pending_access, {}
+            counts, self._pending_counts = self._pending_counts, Counter()
+            self._flushed_at = time.monotonic()
+        if not access and not counts:
+            return
+        try:
+            with self.transaction() as conn:
+                conn.executemany(
+                    'UPDATE products SET accessed_at = MAX(accessed_at, ?) WHERE product_id = ?',
+                    [(accessed_at, product_id) for product_id, accessed_at in access.items()]
+                )
+                conn.executemany(
+                    'INSERT INTO cache_stats (name, value) VALUES (?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                    list(counts.items())
+                )
+        except Exception as e:
+            logger.error(f"Ошибка при записи статистики кэша товаров: {e}")
+
+    def get(self, product_id):
+        """Запись кэша или None; устаревшая запись возвращается для условной перепроверки"""
+        try:
+            row = self.execute('SELECT * FROM products WHERE product_id = ?', (product_id,)).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+
+            now = time.time()
+            product = json.loads(row['static_data'])
+            product.update(json.loads(row['volatile_data']))
+            fresh = (
+                now - row['volatile_at'] < self.volatile_ttl
+                and now - row['static_at'] < self.static_ttl
+            )
+            self._count('hits' if fresh else 'stale', product_id, now)
+            return CacheEntry(product, fresh, row['etag'], row['last_modified'])
+        except Exception as e:
+            logger.error(f"Ошибка при чтении кэша товара {product_id}: {e}")
+            return None
+
+    def put(self, product_id, product_data, etag=None, last_modified=None):
+        """Сохранение нормализованных данных товара"""
+        static_data = {k: v for k, v in product_data.items() if k not in VOLATILE_FIELDS and k != 'source'}
+        volatile_data = {k: product_data[k] for k in VOLATILE_FIELDS if k in product_data}
+        now = time.time()
+        try:
+            self.execute(
+                'INSERT OR REPLACE INTO products '
+                '(product_id, static_data, volatile_data, static_at, volatile_at, accessed_at, etag, last_modified) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (product_id, json.dumps(static_data, ensure_ascii=False),
+                 json.dumps(volatile_data, ensure_ascii=False),
+                 now, now, now, etag, last_modified)
+            )
+            with self._pending_lock:
+                self._puts_since_evict += 1
+                due = self._puts_since_evict >= self.evict_every
+                if due:
+                    self._puts_since_evict = 0
+            if due:
+                self._evict()
+        except Exception as e:
+            logger.error(f"Ошибка при записи товара {product_id} в кэш: {e}")
+
+    def revalidate(self, product_id, etag=None, last_modified=None):
+        """Продление записи после ответа 304 Not Modified"""
+        now = time.time()
+        self.execute(
+            'UPDATE products SET static_at = ?, volatile_at = ?, '
+            'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) '
+            'WHERE product_id = ?',
+            (now, now, etag, last_modified, product_id)
+        )
+        self._count('revalidated')
+
+    def update_volatile(self, product_id, fields):
+        """Обновление только цены и наличия (например, по данным карточки из списка товаров)"""
+        return self.update_volatile_many([(product_id, fields)]) > 0
+
+    def update_volatile_many(self, updates):
+        """Цена и наличие для порции товаров [(product_id, поля)] одной транзакцией
+
+        Обновляются только записи, у которых остальные данные еще свежие: иначе
+        товар все равно придется загружать целиком. Возвращает число обновленных записей.
+        """
+        now = time.time()
+        rows = []
+        for product_id, fields in updates:
+            volatile_data = {k: fields[k] for k in VOLATILE_FIELDS if k in fields}
+            if product_id and volatile_data:
+                rows.append((json.dumps(volatile_data, ensure_ascii=False), now, product_id, now - self.static_ttl))
+        if not rows:
+            return 0
+        try:
+            with self.transaction() as conn:
+                before = conn.total_changes
+                conn.executemany(
+                    'UPDATE products SET volatile_data = ?, volatile_at = ? WHERE product_id = ? AND static_at > ?',
+                    rows
+                )
+                updated = conn.total_changes - before
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении цен в кэше товаров: {e}")
+            return 0
+        if updated:
+            self._count('volatile_updates', amount=updated)
+        return updated
+
+    def _evict(self):
+        """Вытеснение давно не использованных записей сверх max_entries"""
+        if not self.max_entries:
+            return
+        count = self.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.execute(
+                'DELETE FROM products WHERE product_id IN '
+                '(SELECT product_id FROM products ORDER BY accessed_at ASC LIMIT ?)',
+                (excess,)
+            )
+            logger.info(f"Из кэша товаров вытеснено {excess} записей")
+
+    def stats(self):
+        """Статистика кэша по всем воркерам"""
+        self.flush()
+        counters = {row['name']: row['value'] for row in self.execute('SELECT name, value FROM cache_stats')}
+        hits = counters.get('hits', 0)
+        lookups = hits + counters.get('stale', 0) + counters.get('misses', 0)
+        return {
+            'entries': self.execute('SELECT COUNT(*) FROM products').fetchone()[0],
+            'hits': hits,
+            'stale': counters.get('stale', 0),
+            'misses': counters.get('misses', 0),
+            'revalidated': counters.get('revalidated', 0),
+            'volatile_updates': counters.get('volatile_updates', 0),
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
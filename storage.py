@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Каталог локальных данных (кэш, задания, состояние обходов), общий для воркеров gunicorn
+DATA_DIR = os.environ.get(
+    'UZUM_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+)
+
+
+def data_path(name):
+    """Путь к файлу в каталоге локальных данных"""
+    return os.path.join(DATA_DIR, name)
+
+
+class SQLiteStore:
+    """Базовое хранилище SQLite: отдельное соединение на поток и процесс, режим WAL"""
+    
+    SCHEMA = ''
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+    
+    def _connect(self):
+        """Соединение текущего потока; после fork открывается заново"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if self.SCHEMA:
+            conn.executescript(self.SCHEMA)
+        
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+    
+    def execute(self, sql, params=()):
+        return self._connect().execute(sql, params)
+    
+    @contextmanager
+    def transaction(self):
+        """Транзакция с немедленной блокировкой записи"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
@@ -0,0 +1,326 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Метка старого документа: после перехода во вкладке появится новый window без нее,
+# и условие готовности не сработает на предыдущей странице
+STALE_MARK_JS = "window.__uzumTabStale = true;"
+STALE_CHECK_JS = "if (window.__uzumTabStale) return false;\n"
+
+# Размер кучи JS вкладки (performance.memory есть только в Chrome)
+TAB_HEAP_JS = "return performance.memory ? performance.memory.usedJSHeapSize : 0;"
+
+
+def _navigate(driver, url):
+    """Переход без ожидания загрузки"""
+    driver.execute_cdp_cmd('Page.navigate', {'url': url})
+
+
+class _Tab:
+    __slots__ = ('handle', 'url', 'future', 'started', 'pages', 'context')
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.url = None
+        self.future = None
+        self.started = 0.0
+        self.pages = 0
+        self.context = None
+
+
+class TabScheduler:
+    """Параллельная отрисовка страниц в нескольких вкладках одного Chrome
+
+    Фоновый поток берет браузер из пула, открывает tabs вкладок и раздает
+    им адреса из очереди. Переход запускается без ожидания загрузки
+    (navigate(driver, url), по умолчанию Page.navigate), затем вкладки
+    опрашиваются по кругу условием ready_script; готовая (или не
+    дождавшаяся за page_timeout) вкладка разбирается через
+    harvest(driver, url, ready, waited, context), где waited - секунды от
+    перехода до готовности, context - то, что вернул navigate. Результат
+    передается в Future. Вкладка пересоздается после max_tab_pages страниц
+    или если куча JS выросла больше max_tab_heap_mb, браузер возвращается
+    в пул после max_driver_pages страниц или idle_timeout секунд без работы.
+
+    Пока все браузеры пула заняты (например, обходом магазинов), очередь
+    ждет; страница, не дождавшаяся браузера за queue_timeout секунд,
+    завершается ошибкой, остальные остаются в очереди.
+    """
+
+    def __init__(self, pool, ready_script, harvest, tabs=4, page_timeout=10, poll=0.2,
+                 max_tab_pages=20, max_tab_heap_mb=256, max_driver_pages=None, idle_timeout=5,
+                 queue_timeout=None, acquire_poll=5, prepare_tab=None, navigate=None, throttle=None,
+                 on_event=None):
+        # prepare_tab(driver) настраивает новую вкладку (например, блокировку ресурсов),
+        # throttle(url) возвращает 0, если переход разрешен, иначе сколько секунд подождать
+        self.pool = pool
+        self.ready_script = STALE_CHECK_JS + ready_script
+        self._harvest = harvest
+        self.tabs = max(1, tabs)
+        self.page_timeout = page_timeout
+        self.poll = poll
+        self.max_tab_pages = max_tab_pages
+        self.max_tab_heap = max_tab_heap_mb * 2 ** 20 if max_tab_heap_mb else 0
+        self.max_driver_pages = pool.max_pages if max_driver_pages is None else max_driver_pages
+        self.idle_timeout = idle_timeout
+        self.queue_timeout = pool.acquire_timeout if queue_timeout is None else queue_timeout
+        self.acquire_poll = acquire_poll
+        self._prepare_tab = prepare_tab or (lambda driver: None)
+        self._navigate = navigate or _navigate
+        self._throttle = throttle or (lambda url: 0)
+        self._on_event = on_event or (lambda event: None)
+
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._thread = None
+        self._stopped = False
+
+        # Состояние браузера меняет только фоновый поток
+        self._driver = None
+        self._tabs = []
+        self._driver_pages = 0
+
+        self._stats = {
+            'harvested': 0, 'timeouts': 0, 'failed': 0, 'tabs_recycled': 0, 'drivers': 0,
+            'acquire_waits': 0, 'expired': 0,
+        }
+
+    def submit(self, url):
+        """Постановка страницы в очередь; Future вернет результат harvest"""
+        future = Future()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name='uzum-tabs', daemon=True)
+                self._thread.start()
+            self._queue.append((url, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def render(self, url, timeout=None):
+        """Синхронная отрисовка одной страницы через общую очередь вкладок"""
+        return self.submit(url).result(timeout)
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+    def _busy(self):
+        return [tab for tab in self._tabs if tab.future is not None]
+
+    def _run(self):
+        idle_since = time.monotonic()
+        while True:
+            with self._cond:
+                if self._stopped:
+                    break
+                idle = not self._queue and not self._busy()
+                if idle:
+                    remaining = self.idle_timeout - (time.monotonic() - idle_since)
+                    if self._driver is None or remaining > 0:
+                        self._cond.wait(remaining if self._driver is not None else None)
+                        continue
+            if idle:
+                # Без работы браузер возвращается в пул для обычных запросов
+                self._release()
+                continue
+            idle_since = time.monotonic()
+
+            try:
+                if self._driver is None and not self._start():
+                    # Браузеры пула заняты: ждем дальше, ошибку получают только просроченные страницы
+                    self._count('acquire_waits')
+                    self._expire_queue()
+                    continue
+                dispatched = self._dispatch()
+                harvested = self._harvest_ready()
+                if self._driver_pages >= self.max_driver_pages > 0 and not self._busy():
+                    logger.info(f"Браузер вкладок обработал {self._driver_pages} страниц, возвращаем в пул")
+                    self._release()
+                if not dispatched and not harvested:
+                    time.sleep(self.poll)
+            except Exception as e:
+                logger.error(f"Ошибка браузера вкладок, пересоздаем: {e}")
+                self._fail_busy(e)
+                self._release(broken=True)
+
+        self._fail_queue(RuntimeError("Планировщик вкладок остановлен"))
+        self._fail_busy(RuntimeError("Планировщик вкладок остановлен"))
+        self._release()
+
+    def _start(self):
+        """Браузер из пула и tabs вкладок в нем"""
+        driver = self.pool.acquire(timeout=self.acquire_poll)
+        if driver is None:
+            return False
+        self._driver = driver
+        self._driver_pages = 0
+        handles = driver.window_handles
+        self._tabs = [_Tab(handles[0])]
+        driver.switch_to.window(handles[0])
+        self._prepare_tab(driver)
+        for _ in range(self.tabs - 1):
+            self._tabs.append(self._open_tab())
+        self._count('drivers')
+        logger.info(f"Открыто {len(self._tabs)} вкладок для параллельной отрисовки")
+        return True
+
+    def _open_tab(self):
+        driver = self._driver
+        driver.switch_to.new_window('tab')
+        self._prepare_tab(driver)
+        return _Tab(driver.current_window_handle)
+
+    def _release(self, broken=False):
+        """Возврат браузера в пул с одной вкладкой"""
+        driver, tabs = self._driver, self._tabs
+        self._driver, self._tabs = None, []
+        if driver is None:
+            return
+        if not broken:
+            try:
+                for tab in tabs[1:]:
+                    driver.switch_to.window(tab.handle)
+                    driver.close()
+                driver.switch_to.window(tabs[0].handle)
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии вкладок: {e}")
+                broken = True
+        self.pool.release(driver, broken=broken, pages=max(1, self._driver_pages))
+
+    def _dispatch(self):
+        """Раздача адресов из очереди свободным вкладкам"""
+        if self._driver_pages >= self.max_driver_pages > 0:
+            # Браузер отработал свое: дожидаемся занятых вкладок
+            return 0
+        driver = self._driver
+        dispatched = 0
+        for tab in self._tabs:
+            if tab.future is not None:
+                continue
+            with self._cond:
+                while self._queue and self._queue[0][1].cancelled():
+                    self._queue.popleft()
+                if not self._queue:
+                    break
+                url, future, _ = self._queue[0]
+                if self._throttle(url):
+                    # Лимит запросов к хосту: страница ждет следующего круга
+                    break
+                self._queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            driver.switch_to.window(tab.handle)
+            driver.execute_script(STALE_MARK_JS)
+            tab.url, tab.future, tab.started = url, future, time.monotonic()
+            tab.context = self._navigate(driver, url)
+            self._driver_pages += 1
+            dispatched += 1
+            self._on_event('dispatch')
+        return dispatched
+
+    def _harvest_ready(self):
+        """Разбор вкладок, где страница готова или истекло время ожидания"""
+        driver = self._driver
+        harvested = 0
+        for i, tab in enumerate(self._tabs):
+            if tab.future is None:
+                continue
+            driver.switch_to.window(tab.handle)
+            ready = bool(driver.execute_script(self.ready_script))
+            elapsed = time.monotonic() - tab.started
+            if not ready and elapsed < self.page_timeout:
+                continue
+
+            if not ready:
+                logger.warning(f"Вкладка не подготовилась за {self.page_timeout} секунд: {tab.url}")
+                self._count('timeouts')
+                self._on_event('timeout')
+            future, url, context = tab.future, tab.url, tab.context
+            tab.future = tab.url = tab.context = None
+            tab.pages += 1
+            try:
+                future.set_result(self._harvest(driver, url, ready, elapsed, context))
+                self._count('harvested')
+                self._on_event('harvest')
+            except Exception as e:
+                future.set_exception(e)
+                self._count('failed')
+            harvested += 1
+
+            if self._should_recycle(tab):
+                self._tabs[i] = self._recycle_tab(tab)
+        return harvested
+
+    def _should_recycle(self, tab):
+        if self.max_tab_pages and tab.pages >= self.max_tab_pages:
+            return True
+        if self.max_tab_heap:
+            heap = self._driver.execute_script(TAB_HEAP_JS) or 0
+            if heap > self.max_tab_heap:
+                logger.info(f"Куча JS вкладки выросла до {heap / 2 ** 20:.0f} МБ, пересоздаем вкладку")
+                return True
+        return False
+
+    def _recycle_tab(self, tab):
+        """Новая вкладка вместо отработавшей (сначала открывается новая, чтобы окно не закрылось)"""
+        driver = self._driver
+        new_tab = self._open_tab()
+        driver.switch_to.window(tab.handle)
+        driver.close()
+        driver.switch_to.window(new_tab.handle)
+        self._count('tabs_recycled')
+        self._on_event('recycle_tab')
+        return new_tab
+
+    def _fail_busy(self, error):
+        for tab in self._busy():
+            if not tab.future.done():
+                tab.future.set_exception(error)
+            tab.future = tab.url = tab.context = None
+
+    def _expire_queue(self):
+        """Ошибка для страниц, которые ждут браузер дольше queue_timeout"""
+        deadline = time.monotonic() - self.queue_timeout
+        with self._cond:
+            expired, waiting = [], collections.deque()
+            for item in self._queue:
+                (expired if item[2] <= deadline or item[1].cancelled() else waiting).append(item)
+            if not expired:
+                return
+            self._queue = waiting
+        error = RuntimeError(f"Не дождались свободного WebDriver для вкладок за {self.queue_timeout} с")
+        for _, future, _ in expired:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+                self._count('expired')
+        logger.warning(f"Браузер для вкладок занят, страниц в очереди: {len(self._queue)}")
+
+    def _fail_queue(self, error):
+        with self._cond:
+            queued, self._queue = self._queue, collections.deque()
+        for _, future, _ in queued:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def stop(self):
+        """Остановка фонового потока; вкладки закрываются, браузер возвращается в пул"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(self.page_timeout + 5)
+
+    def stats(self):
+        with self._cond:
+            result = dict(self._stats)
+            result['queued'] = len(self._queue)
+        result['tabs'] = len(self._tabs)
+        result['busy'] = len(self._busy())
+        return result
+
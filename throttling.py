@@ -0,0 +1,238 @@
+import logging
+import random
+import time
+from urllib.parse import urlparse
+
+from storage import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Признаки страницы с капчей или проверкой на бота вместо содержимого (с учетом регистра)
+CAPTCHA_MARKERS = ('smartcaptcha', 'g-recaptcha', 'h-captcha', 'cf-chl-', 'checkcaptcha')
+
+# Ответы, после которых стоит повторить запрос позже
+TRANSIENT_STATUSES = frozenset((500, 502, 503, 504, 520, 522, 524))
+THROTTLED_STATUSES = frozenset((403, 429))
+
+# Итоги запроса для адаптации частоты и решения о повторе
+OK = 'ok'
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+
+class RetriesExhausted(Exception):
+    """Запрос не удался после всех повторов"""
+
+    def __init__(self, message, outcome):
+        super().__init__(message)
+        self.outcome = outcome
+
+
+def classify_response(response, captcha_markers=CAPTCHA_MARKERS):
+    """Итог запроса по ответу: успех, ограничение частоты, временная или постоянная ошибка"""
+    status = response.status_code
+    if status in THROTTLED_STATUSES:
+        return THROTTLED
+    if status in TRANSIENT_STATUSES:
+        return TRANSIENT
+    if status >= 400:
+        return PERMANENT
+    if status == 200 and captcha_markers and 'html' in response.headers.get('Content-Type', ''):
+        text = response.text
+        if any(marker in text for marker in captcha_markers):
+            return THROTTLED
+    return OK
+
+
+def classify_exception(error):
+    """Сетевые ошибки и таймауты временные, остальные (неверный URL и т.п.) постоянные"""
+    import requests
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return TRANSIENT
+    return PERMANENT
+
+
+def retry_after_seconds(response):
+    """Значение заголовка Retry-After в секундах (поддерживается только число)"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class RateLimiter(SQLiteStore):
+    """Token bucket на каждый хост, общий для потоков и воркеров gunicorn
+
+    Состояние корзины хранится в SQLite, поэтому все процессы делят один
+    лимит. Частота подстраивается под ответы сайта: при ограничениях и
+    капче она снижается вдвое и хост ставится на паузу, при ошибках
+    снижается умеренно, при успешных ответах медленно растет обратно.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            host TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            rate REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            paused_until REAL NOT NULL DEFAULT 0
+        );
+    '''
+
+    def __init__(self, path, rate=5.0, burst=10, min_rate=0.2, cooldown=30.0, on_event=None):
+        super().__init__(path)
+        self.max_rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.cooldown = cooldown
+        self._on_event = on_event or (lambda event: None)
+
+    def _bucket(self, conn, host, now):
+        row = conn.execute('SELECT * FROM rate_buckets WHERE host = ?', (host,)).fetchone()
+        if row is None:
+            return float(self.burst), self.max_rate, 0.0
+        # Пополнение корзины за прошедшее время
+        rate = min(self.max_rate, row['rate'])
+        tokens = min(self.burst, row['tokens'] + (now - row['updated_at']) * rate)
+        return tokens, rate, row['paused_until']
+
+    def _save(self, conn, host, tokens, rate, now, paused_until):
+        conn.execute(
+            'INSERT OR REPLACE INTO rate_buckets (host, tokens, rate, updated_at, paused_until) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (host, tokens, rate, now, paused_until)
+        )
+
+    def try_acquire(self, host):
+        """Взять токен; возвращает 0 при успехе или сколько секунд подождать"""
+        now = time.time()
+        with self.transaction() as conn:
+            tokens, rate, paused_until = self._bucket(conn, host, now)
+            if paused_until > now:
+                wait = paused_until - now
+            elif tokens >= 1:
+                self._save(conn, host, tokens - 1, rate, now, paused_until)
+                return 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._save(conn, host, tokens, rate, now, paused_until)
+        return wait
+
+    def acquire(self, host, timeout=60.0):
+        """Ожидание разрешения на запрос к хосту; False, если не дождались за timeout"""
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                if waited:
+                    self._on_event('delayed')
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._on_event('timeout')
+                return False
+            waited = True
+            # Небольшой разброс, чтобы воркеры не просыпались одновременно
+            time.sleep(min(wait, remaining) * random.uniform(1.0, 1.2))
+
+    def report(self, host, outcome, retry_after=None):
+        """Подстройка частоты по итогу запроса"""
+        now = time.time()
+        with self.transaction() as conn:
+            tokens, rate, paused_until = self._bucket(conn, host, now)
+            if outcome == OK:
+                # Аддитивный рост: до полной частоты примерно за сотню успешных запросов
+                rate = min(self.max_rate, rate + self.max_rate / 100)
+            elif outcome == THROTTLED:
+                rate = max(self.min_rate, rate / 2)
+                paused_until = max(paused_until, now + (retry_after or self.cooldown))
+                tokens = 0.0
+            elif outcome == TRANSIENT:
+                rate = max(self.min_rate, rate * 0.8)
+            self._save(conn, host, tokens, rate, now, paused_until)
+
+        if outcome == THROTTLED:
+            logger.warning(f"Сайт {host} ограничивает запросы, частота снижена до {rate:.2f} в секунду")
+            self._on_event('throttled')
+
+    def stats(self):
+        now = time.time()
+        rows = self.execute('SELECT * FROM rate_buckets').fetchall()
+        return {
+            row['host']: {
+                'rate': round(row['rate'], 3),
+                'max_rate': self.max_rate,
+                'paused_for': round(max(0.0, row['paused_until'] - now), 1),
+            }
+            for row in rows
+        }
+
+
+class RetryPolicy:
+    """Повторы с экспоненциальной задержкой и случайным разбросом (full jitter)"""
+
+    def __init__(self, retries=3, backoff=1.0, max_backoff=30.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, retry_after=None):
+        """Пауза перед повтором номер attempt (с единицы)"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+
+class ThrottledHttp:
+    """HTTP GET через лимит частоты хоста с повторами временных ошибок
+
+    Возвращает ответ при успехе и при постоянной ошибке (например, 404),
+    чтобы вызывающий код сам решил, что с ней делать. Если временные ошибки
+    не прошли за все попытки, выбрасывается RetriesExhausted.
+    """
+
+    def __init__(self, session_factory, limiter=None, policy=None, acquire_timeout=60.0,
+                 captcha_markers=CAPTCHA_MARKERS, on_event=None):
+        self._session_factory = session_factory
+        self.limiter = limiter
+        self.policy = policy or RetryPolicy()
+        self.acquire_timeout = acquire_timeout
+        self.captcha_markers = captcha_markers
+        self._on_event = on_event or (lambda event: None)
+
+    def get(self, url, **kwargs):
+        host = urlparse(url).hostname or ''
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None and not self.limiter.acquire(host, self.acquire_timeout):
+                raise RetriesExhausted(f"Не дождались лимита запросов к {host}", THROTTLED)
+
+            response = None
+            try:
+                response = self._session_factory().get(url, **kwargs)
+                outcome = classify_response(response, self.captcha_markers)
+                error = 'Капча' if response.status_code == 200 else f"HTTP {response.status_code}"
+            except Exception as e:
+                outcome = classify_exception(e)
+                if outcome == PERMANENT:
+                    raise
+                error = str(e)
+
+            if self.limiter is not None:
+                self.limiter.report(host, outcome, retry_after_seconds(response))
+            if outcome in (OK, PERMANENT):
+                return response
+
+            if attempt > self.policy.retries:
+                self._on_event('exhausted')
+                raise RetriesExhausted(f"{error} после {attempt} попыток: {url}", outcome)
+
+            delay = self.policy.delay(attempt, retry_after_seconds(response))
+            logger.warning(f"{error} при запросе {url}, повтор {attempt} через {delay:.1f} с")
+            self._on_event('retry')
+            time.sleep(delay)